@@ -1,5 +1,79 @@
-import pandas as pd
-import numpy as np
+from dataset_store import get_derived, exact_metrics
+from instrumentation import span
+from rollup import rollup
+from sql_backend import sql_table, aggregate
+
+METRICS = ["employment_rate_overall", "employment_rate_ft_perm", "gross_monthly_median"]
+
+# Moving-average windows offered in the UI; others are computed on demand
+TREND_WINDOWS = (2, 3, 5)
+
+# Drill-down levels that are precomputed (school/degree left out = rolled up)
+TREND_LEVELS = [
+    ["university"],
+    ["university", "school"],
+    ["university", "degree"],
+    ["university", "school", "degree"],
+]
+
+def _add_trend_stats(d, rolling_window):
+    """Add YoY and moving-average columns to one slice's per-year means."""
+    for c in METRICS:
+        d[f"{c}_yoy_abs"] = d[c].diff()
+        d[f"{c}_yoy_pct"] = d[c].pct_change(fill_method=None) * 100
+        d[f"{c}_ma{rolling_window}"] = d[c].rolling(rolling_window, min_periods=1).mean()
+    return d
+
+def _grouped_trend_stats(d, keys):
+    """Same columns as _add_trend_stats for every group at once, all TREND_WINDOWS."""
+    grouped = d.groupby(keys, observed=True, sort=False)[METRICS]
+    diff = grouped.diff()
+    pct = grouped.pct_change() * 100
+    rolled = {
+        w: grouped.rolling(w, min_periods=1).mean().reset_index(level=list(range(len(keys))), drop=True)
+        for w in TREND_WINDOWS
+    }
+    for c in METRICS:
+        d[f"{c}_yoy_abs"] = diff[c]
+        d[f"{c}_yoy_pct"] = pct[c]
+        for w in TREND_WINDOWS:
+            d[f"{c}_ma{w}"] = rolled[w][c]
+    return d
+
+def _trend_key(university, school, degree):
+    return (university or None, school or None, degree or None)
+
+def _build_trend_table(df):
+    """
+    Materialise yearly trend tables for every precomputed drill-down level.
+
+    Returns:
+        dict: (university, school, degree) -> DataFrame holding the per-year
+        means plus YoY and moving-average columns for every TREND_WINDOWS size.
+        Levels that are rolled up have None in their key position.
+    """
+    base = df[["university", "school", "degree", "year"]].join(exact_metrics(df[METRICS]))
+    table = {}
+    for keys in TREND_LEVELS:
+        d = (
+            base.groupby(keys + ["year"], observed=True, as_index=False)[METRICS]
+            .mean(numeric_only=True)
+            .sort_values(keys + ["year"], kind="mergesort")
+            .reset_index(drop=True)
+        )
+        d = _grouped_trend_stats(d, keys)
+
+        values = d.drop(columns=keys)
+        for key, positions in d.groupby(keys, observed=True, sort=False).indices.items():
+            parts = dict(zip(keys, key if isinstance(key, tuple) else (key,)))
+            table[_trend_key(parts.get("university"), parts.get("school"), parts.get("degree"))] = (
+                values.iloc[positions].reset_index(drop=True)
+            )
+    return table
+
+def get_trend_table(file_path):
+    """Precomputed trend tables keyed by (university, school, degree), cached per dataset version."""
+    return get_derived(file_path, "trend_table", _build_trend_table)
 
 def analyze_trends(file_path, university=None, school=None, degree=None, rolling_window=3):
     """
@@ -15,34 +89,36 @@ def analyze_trends(file_path, university=None, school=None, degree=None, rolling
     Returns:
         DataFrame with trend analysis or None if no data found
     """
-    # Load dataset
-    df = pd.read_csv(file_path)
-    
-    # Ensure numeric types
-    df["year"] = pd.to_numeric(df["year"], errors="coerce")
-    metrics = ["employment_rate_overall", "employment_rate_ft_perm", "gross_monthly_median"]
-    for c in metrics:
-        df[c] = pd.to_numeric(df[c], errors="coerce")
-    
-    # Filter data
-    d = df.copy()
-    if university:
-        d = d[d["university"] == university].copy()
-    if school:
-        d = d[d["school"] == school].copy()
-    if degree:
-        d = d[d["degree"] == degree].copy()
-    
+    metrics = METRICS
+    filters = {"university": university or None, "school": school or None, "degree": degree or None}
+
+    # SQL backend: the database averages just the matching rows per year
+    table = sql_table(file_path)
+    if table:
+        d = aggregate(table, ["year"], metrics, filters, stats=("mean",))
+        if d.empty:
+            return None
+        d.columns = ["year"] + metrics
+        return _add_trend_stats(d, rolling_window)
+
+    # Common drill-downs are a keyed lookup into the materialised trend table
+    if university and rolling_window in TREND_WINDOWS:
+        table = get_trend_table(file_path)
+        with span("filter"):
+            cached = table.get(_trend_key(university, school, degree))
+            if cached is None:
+                return None
+            columns = ["year"] + metrics + [
+                col for c in metrics
+                for col in (f"{c}_yoy_abs", f"{c}_yoy_pct", f"{c}_ma{rolling_window}")
+            ]
+            return cached[columns].copy()
+
+    # Unusual windows (or no university): per-year means merged from the rollup cube
+    d = rollup(file_path, ["year"], filters, metrics=metrics, stats=("mean",))
     if d.empty:
         return None
-    
-    d = d.sort_values("year")
-    d = d.groupby("year", as_index=False)[metrics].mean(numeric_only=True).sort_values("year")
-    
+    d.columns = ["year"] + metrics
+
     # Compute value-added stats
-    for c in metrics:
-        d[f"{c}_yoy_abs"] = d[c].diff()
-        d[f"{c}_yoy_pct"] = d[c].pct_change(fill_method=None) * 100
-        d[f"{c}_ma{rolling_window}"] = d[c].rolling(rolling_window, min_periods=1).mean()
-    
-    return d
+    return _add_trend_stats(d, rolling_window)
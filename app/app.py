@@ -1,36 +1,67 @@
 from flask import Flask, render_template, request, jsonify, send_file
 import pandas as pd
 import numpy as np
-from rankings import rankings
+from rankings import rankings, available_years as ranking_years
 from function5_projection import calculate_salary_projections
 from analytics import analyze_trends
 from salary_analysis import (
-    calculate_iqr_analysis,
+    SPREAD_METRICS,
+    top_spread,
+    page_spread,
+    spread_rollup,
+    sort_spread,
     get_filtered_salary_data,
+    get_salary_rollup,
+    get_filtered_salary_batch,
     get_degrees_for_university,
     get_years_for_university_degree
 )
 from data_helpers import (
     get_schools_for_university,
-    get_degrees_for_university_school
+    get_degrees_for_university_school,
+    get_universities,
+    get_dimension_payload,
+    query_table
 )
+from dataset_store import (
+    RAW_CSV, CLEANED_CSV, GROUPED_CSV, DATA_DIR,
+    file_digest
+)
+from compressed_files import available_encodings, ensure_variant, precompress_directory
+from response_cache import cached_response, response_cache
+from instrumentation import init_app as init_instrumentation, render_metrics
 import os
 
 from relationship_analysis import (
+    CORRELATION_LEVELS,
+    correlation_table,
+    correlations,
     employment_rate_vs_salary,
     load_cleaned_data,
+    relationship_trend,
 )
+from json_api import frame_payload, json_response
+from rollup import DIMENSIONS, ROLLUP_STATS, rollup
+from jobs import JobQueueFull, job_manager
+from warmup import WARMUP_STEPS, start_warm_up, state as warmup_state
 
 app = Flask(__name__, template_folder='../templates')
 
-# Define a function to load different CSV files for each route (if needed)
-def load_csv(file_path):
-    return pd.read_csv(file_path)
+# Per-stage timings (Server-Timing header, /metrics) and opt-in slow-request profiles
+init_instrumentation(app)
+
+# Compiling the template is part of warming up too
+WARMUP_STEPS.append(('templates', lambda: app.jinja_env.get_template('index.html')))
+
+# Build .gz/.br copies of the served CSV files once at startup
+try:
+    precompress_directory(DATA_DIR)
+except OSError as e:
+    app.logger.warning('Could not precompress CSV files: %s', e)
 
 @app.route('/')
 def index():
-    # Default tab - show overview with CSV preview
-    df = load_csv('../cleaned.csv')
+    # Default tab - show overview with CSV preview (loaded client-side)
     return render_template('index.html', 
                          data=[], 
                          active_tab='overview',
@@ -43,6 +74,7 @@ def index():
                          rolling_window=3)
 
 @app.route('/function1')
+@cached_response(CLEANED_CSV)
 def function1():
     # Graduate Employment Trend Analysis
     university = request.args.get('university')
@@ -50,21 +82,14 @@ def function1():
     degree = request.args.get('degree')
     rolling_window = int(request.args.get('rolling_window', 3))
     
-    df = load_csv('../cleaned.csv')
-    universities = sorted(df['university'].unique())
-    schools = []
-    degrees = []
-    
-    if university:
-        schools = sorted(df[df['university'] == university]['school'].unique())
-        if school:
-            degrees = sorted(df[(df['university'] == university) & (df['school'] == school)]['degree'].unique())
-        else:
-            degrees = sorted(df[df['university'] == university]['degree'].unique())
+    # Dropdown lists come straight from the precomputed dimension index
+    universities = get_universities(CLEANED_CSV)
+    schools = get_schools_for_university(CLEANED_CSV, university)
+    degrees = get_degrees_for_university_school(CLEANED_CSV, university, school)
     
     trend_data = None
     if university:
-        trend_data = analyze_trends('../cleaned.csv', university, school, degree, rolling_window)
+        trend_data = analyze_trends(CLEANED_CSV, university, school, degree, rolling_window)
     
     return render_template('index.html', 
                          data=trend_data.to_dict(orient='records') if trend_data is not None else [],
@@ -78,33 +103,32 @@ def function1():
                          rolling_window=rolling_window)
 
 @app.route('/function2')
+@cached_response(GROUPED_CSV)
 def function2():
-    # Use salary_analysis module for IQR analysis
-    function2_data, top_iqr, top_iqr_ratio = calculate_iqr_analysis('../grouped_salary_analysis.csv')
-
-    # Extract unique values for degree, university, and year
-    unique_degrees = function2_data['degree'].unique()
-    unique_universities = function2_data['university'].unique()
-    unique_years = function2_data['year'].unique()
+    # Salary spread (IQR) analysis: only the top-5 lists are rendered here,
+    # the record table is paged through /api/v1/salary-spread
+    top_iqr = top_spread(GROUPED_CSV, 'IQR', 5)
+    top_iqr_ratio = top_spread(GROUPED_CSV, 'IQR_ratio', 5)
 
     # Render the template with data and active tab as 'tab2'
     return render_template(
         'index.html', 
-        data=function2_data.to_dict(orient='records'),
+        data=[],
         top_iqr=top_iqr.to_dict(orient='records'),
         top_iqr_ratio=top_iqr_ratio.to_dict(orient='records'),
         active_tab='tab2',
-        degrees=unique_degrees,
-        universities=unique_universities,
+        degrees=[],
+        universities=[],
         schools=[],
         selected_university=None,
         selected_school=None,
         selected_degree=None,
         rolling_window=3,
-        years=unique_years
+        years=[]
     )
 
 @app.route('/function3')
+@cached_response(CLEANED_CSV)
 def function3():
     # Rankings
     year = request.args.get('year')
@@ -114,9 +138,8 @@ def function3():
     include_most_improved = request.args.get('include_most_improved') == '1'
 
     # Choose default year if not provided (latest year in dataset)
-    csv_path = '../cleaned.csv'
-    df = load_csv(csv_path)
-    available_years = sorted(pd.to_numeric(df["year"], errors="coerce").dropna().astype(int).unique().tolist())
+    csv_path = CLEANED_CSV
+    available_years = ranking_years(csv_path)
     default_year = available_years[-1] if available_years else 2023
 
     year = int(year) if year else int(default_year)
@@ -154,7 +177,38 @@ def function3():
         rolling_window=3,
     )
 
+def _rankings_from_args(args):
+    """Run rankings() for request args; returns (result, error_response)."""
+    available_years = ranking_years(CLEANED_CSV)
+    try:
+        year = int(args.get('year') or available_years[-1])
+        n = int(args.get('n', 10))
+    except (ValueError, IndexError):
+        return None, (jsonify({'error': 'Invalid year or n'}), 400)
+
+    try:
+        result = rankings(
+            csv_path=CLEANED_CSV,
+            year=year,
+            n=n,
+            mode=args.get('mode', 'top'),
+            group_by=args.get('group_by', 'degree'),
+            include_most_improved=args.get('include_most_improved') == '1',
+        )
+    except ValueError as e:
+        return None, (jsonify({'error': str(e)}), 404)
+    return result, None
+
+@app.route('/api/rankings', methods=['GET'])
+def api_rankings():
+    """Rankings for one year as JSON (same parameters as /function3)"""
+    result, error = _rankings_from_args(request.args)
+    if error:
+        return error
+    return jsonify(result)
+
 @app.route('/function5')
+@cached_response(CLEANED_CSV)
 def function5():
     # Get filter parameters
     university = request.args.get('university', '')
@@ -177,16 +231,9 @@ def function5():
         limit=limit
     )
     
-    # Get unique universities for dropdown
-    df = load_csv('../cleaned.csv')
-    unique_universities = sorted(df['university'].unique().tolist())
-    
-    # Get degrees for selected university
-    if university:
-        uni_df = df[df['university'] == university]
-        unique_degrees = sorted(uni_df['degree'].unique().tolist())
-    else:
-        unique_degrees = []
+    # Dropdown lists come straight from the precomputed dimension index
+    unique_universities = get_universities(CLEANED_CSV)
+    unique_degrees = get_degrees_for_university_school(CLEANED_CSV, university)
     
     return render_template('index.html', 
                          data=function5_data.to_dict(orient='records'), 
@@ -201,46 +248,29 @@ def function5():
                          rolling_window=3)
 
 @app.route('/function4')
+@cached_response(CLEANED_CSV)
 def function4():
-    df = load_cleaned_data('../cleaned.csv')
-    universities = sorted(df['university'].dropna().unique())
+    df = load_cleaned_data(CLEANED_CSV)
+    universities = get_universities(CLEANED_CSV)
     selected_university = request.args.get('university') or (universities[0] if universities else None)
 
-    degrees = []
-    if selected_university:
-        degrees = sorted(
-            df[df['university'] == selected_university]['degree']
-            .dropna()
-            .unique()
-        )
+    degrees = get_degrees_for_university_school(CLEANED_CSV, selected_university)
     selected_degree = request.args.get('degree') or (degrees[0] if degrees else None)
 
-    if selected_university and selected_degree:
-        df_filtered = df[
-            (df['university'] == selected_university) &
-            (df['degree'] == selected_degree)
-        ].copy()
-    elif selected_university:
-        df_filtered = df[df['university'] == selected_university].copy()
-    else:
-        df_filtered = df.copy()
-
-    trend_data = (
-        df_filtered.groupby('year', as_index=False)
-        .agg({
-            'employment_rate_overall': 'mean',
-            'gross_monthly_median': 'median'
-        })
-        .sort_values('year')
-    )
+    trend_data = relationship_trend(df, selected_university, selected_degree)
 
-    corr = None
+    # Every metric pair for the selected slice, from the precomputed correlation cube
+    slice_correlations = correlations(CLEANED_CSV, selected_university, selected_degree)
+    corr = slice_correlations[
+        (slice_correlations['x'] == 'employment_rate_overall') & (slice_correlations['y'] == 'gross_monthly_median')
+    ]['pearson']
     return render_template(
         'index.html',
         data=trend_data.to_dict(orient='records'),
         trend_data=trend_data.to_dict(orient='records'),
         active_tab='tab4',
-        correlation=corr,
+        correlation=float(corr.iloc[0]) if len(corr) else None,
+        correlations=slice_correlations.to_dict(orient='records'),
         universities=universities,
         schools=[],
         degrees=degrees,
@@ -256,20 +286,52 @@ def get_filtered_data():
     university = request.args.get('university')
     year = request.args.get('year')
 
-    # Use salary_analysis module for filtering
-    result = get_filtered_salary_data('../grouped_salary_analysis.csv', degree, university, year)
+    try:
+        if degree and university and year:
+            # Use salary_analysis module for filtering
+            result = get_filtered_salary_data(GROUPED_CSV, degree, university, year)
+        else:
+            # A rollup (e.g. one university over all years), pooled from the quantile sketches
+            result = get_salary_rollup(CLEANED_CSV, degree, university, year)
+    except ValueError:
+        return jsonify({'error': 'year must be an integer'}), 400
 
     if result is None:
         return jsonify({'error': 'No data found for the selected filters'}), 404
 
     return jsonify(result)
 
+MAX_BATCH_KEYS = 1000
+
+@app.route('/get_filtered_data/batch', methods=['POST'])
+def get_filtered_data_batch():
+    """
+    Look up many (degree, university, year) combinations in one request.
+
+    Body: {"keys": [{"degree": ..., "university": ..., "year": ...}, ...]}
+    Response: {"results": [...]} in the same order, null where nothing was found.
+    """
+    body = request.get_json(silent=True)
+    keys = body.get('keys') if isinstance(body, dict) else None
+    if not isinstance(keys, list):
+        return jsonify({'error': 'Expected a JSON body with a "keys" list'}), 400
+    if len(keys) > MAX_BATCH_KEYS:
+        return jsonify({'error': f'At most {MAX_BATCH_KEYS} keys per request'}), 400
+
+    try:
+        lookups = [(k['degree'], k['university'], k['year']) for k in keys]
+        results = get_filtered_salary_batch(GROUPED_CSV, lookups)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'Each key needs degree, university and an integer year'}), 400
+
+    return jsonify({'results': results})
+
 @app.route('/get_degrees', methods=['GET'])
 def get_degrees():
     university = request.args.get('university')
 
     # Use salary_analysis module for getting degrees
-    degrees = get_degrees_for_university('../grouped_salary_analysis.csv', university)
+    degrees = get_degrees_for_university(GROUPED_CSV, university)
 
     return jsonify({'degrees': degrees})
 
@@ -279,7 +341,7 @@ def get_years():
     degree = request.args.get('degree')
 
     # Use salary_analysis module for getting years
-    years = get_years_for_university_degree('../grouped_salary_analysis.csv', university, degree)
+    years = get_years_for_university_degree(GROUPED_CSV, university, degree)
 
     return jsonify({'years': years})
 
@@ -289,7 +351,7 @@ def api_get_schools():
     university = request.args.get('university')
     
     # Use data_helpers module for getting schools
-    schools = get_schools_for_university('../cleaned.csv', university)
+    schools = get_schools_for_university(CLEANED_CSV, university)
     return jsonify({'schools': schools})
 
 @app.route('/api/get_degrees', methods=['GET'])
@@ -299,23 +361,376 @@ def api_get_degrees():
     school = request.args.get('school')
     
     # Use data_helpers module for getting degrees
-    degrees = get_degrees_for_university_school('../cleaned.csv', university, school)
+    degrees = get_degrees_for_university_school(CLEANED_CSV, university, school)
     return jsonify({'degrees': degrees})
 
+@app.route('/api/dimensions', methods=['GET'])
+def api_dimensions():
+    """Whole university -> school -> degree -> years hierarchy for all dropdowns"""
+    payload, etag = get_dimension_payload(CLEANED_CSV, GROUPED_CSV)
+
+    response = app.response_class(payload, mimetype='application/json')
+    response.set_etag(etag)
+    # Let browsers keep the copy but revalidate it (cheap 304) on each use
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+# JSON API used by the analysis tabs: each filter change is one small request
+# instead of a full page render. Frames are sent column-oriented, straight
+# from their NumPy arrays (see json_api).
+
+SPREAD_COLUMNS = ['degree', 'university', 'year', 'IQR', 'IQR_ratio']
+
+@app.route('/api/v1/trends', methods=['GET'])
+@cached_response(CLEANED_CSV)
+def api_v1_trends():
+    """Trend table for a university (and optional school/degree), as used by /function1"""
+    university = request.args.get('university')
+    school = request.args.get('school') or None
+    degree = request.args.get('degree') or None
+    try:
+        rolling_window = int(request.args.get('rolling_window', 3))
+    except ValueError:
+        return jsonify({'error': 'rolling_window must be an integer'}), 400
+    if not university:
+        return jsonify({'error': 'university is required'}), 400
+    if rolling_window < 1:
+        return jsonify({'error': 'rolling_window must be positive'}), 400
+
+    trend_data = analyze_trends(CLEANED_CSV, university, school, degree, rolling_window)
+    if trend_data is None:
+        trend_data = pd.DataFrame(columns=['year'])
+
+    payload = frame_payload(trend_data)
+    payload.update(university=university, school=school, degree=degree, rolling_window=rolling_window)
+    return json_response(payload)
+
+@app.route('/api/v1/salary-spread', methods=['GET'])
+@cached_response(GROUPED_CSV, CLEANED_CSV)
+def api_v1_salary_spread():
+    """
+    Salary spread (IQR) view: top/bottom-K lists plus one sorted page of records.
+
+    Query params: k, mode (top/bottom), sort (IQR/IQR_ratio), order (asc/desc),
+    offset, limit, university, degree, group_by.
+    Without group_by rows come from the grouped file; with it (e.g.
+    group_by=university,year) they are rollups estimated from quantile sketches.
+    """
+    try:
+        k = min(MAX_TABLE_LIMIT, max(0, int(request.args.get('k', 5))))
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(MAX_TABLE_LIMIT, max(0, int(request.args.get('limit', 50))))
+    except ValueError:
+        return jsonify({'error': 'k, offset and limit must be integers'}), 400
+
+    mode = request.args.get('mode', 'top')
+    sort = request.args.get('sort', 'IQR')
+    if mode not in ('top', 'bottom'):
+        return jsonify({'error': "mode must be 'top' or 'bottom'"}), 400
+    if sort not in SPREAD_METRICS:
+        return jsonify({'error': f'sort must be one of {list(SPREAD_METRICS)}'}), 400
+    descending = request.args.get('order', 'desc').lower() != 'asc'
+
+    filters = {
+        'university': request.args.get('university') or None,
+        'degree': request.args.get('degree') or None,
+    }
+    bottom = mode == 'bottom'
+    group_by = _csv_arg('group_by')
+    if group_by:
+        try:
+            data = spread_rollup(CLEANED_CSV, group_by, **filters)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'dimensions': DIMENSIONS}), 400
+        group_by = [c for c in data.columns if c in DIMENSIONS]
+        top_iqr = sort_spread(data, 'IQR', not bottom).head(k)
+        top_iqr_ratio = sort_spread(data, 'IQR_ratio', not bottom).head(k)
+        page, total = sort_spread(data, sort, descending).iloc[offset:offset + limit], len(data)
+        record_columns = group_by + ['IQR', 'IQR_ratio', 'count']
+    else:
+        top_iqr = top_spread(GROUPED_CSV, 'IQR', k, bottom, **filters)
+        top_iqr_ratio = top_spread(GROUPED_CSV, 'IQR_ratio', k, bottom, **filters)
+        page, total = page_spread(GROUPED_CSV, sort, descending, offset, limit, **filters)
+        record_columns = SPREAD_COLUMNS
+
+    return json_response({
+        'top_iqr': frame_payload(top_iqr),
+        'top_iqr_ratio': frame_payload(top_iqr_ratio),
+        'records': frame_payload(page, record_columns),
+        'total': total,
+        'offset': offset,
+        'limit': limit,
+        'k': k,
+        'mode': mode,
+        'sort': sort,
+        'order': 'desc' if descending else 'asc',
+        'group_by': group_by or None,
+    })
+
+@app.route('/api/v1/rankings', methods=['GET'])
+@cached_response(CLEANED_CSV)
+def api_v1_rankings():
+    """Rankings for one year (same parameters and fields as /api/rankings)"""
+    result, error = _rankings_from_args(request.args)
+    if error:
+        return error
+    return json_response(result)
+
+@app.route('/api/v1/relationship', methods=['GET'])
+@cached_response(CLEANED_CSV)
+def api_v1_relationship():
+    """Yearly employment rate vs median salary for a university/degree, as used by /function4"""
+    universities = get_universities(CLEANED_CSV)
+    university = request.args.get('university') or (universities[0] if universities else None)
+    degrees = get_degrees_for_university_school(CLEANED_CSV, university)
+    degree = request.args.get('degree') or (degrees[0] if degrees else None)
+
+    trend_data = relationship_trend(load_cleaned_data(CLEANED_CSV), university, degree)
+
+    payload = frame_payload(trend_data)
+    payload.update(university=university, degree=degree, degrees=degrees,
+                   correlations=frame_payload(correlations(CLEANED_CSV, university, degree)))
+    return json_response(payload)
+
+@app.route('/api/v1/correlations', methods=['GET'])
+@cached_response(CLEANED_CSV)
+def api_v1_correlations():
+    """Pearson/Spearman for every metric pair: one slice, or a whole level with ?level="""
+    level = request.args.get('level')
+    if level:
+        try:
+            return json_response(dict(frame_payload(correlation_table(CLEANED_CSV, level)), level=level))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'levels': list(CORRELATION_LEVELS)}), 400
+
+    university = request.args.get('university') or None
+    degree = request.args.get('degree') or None
+    try:
+        year = int(request.args['year']) if request.args.get('year') else None
+    except ValueError:
+        return jsonify({'error': 'year must be an integer'}), 400
+    result = correlations(CLEANED_CSV, university, degree, year)
+    return json_response(dict(frame_payload(result), university=university, degree=degree, year=year))
+
+def _csv_arg(name):
+    value = request.args.get(name, '')
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+@app.route('/api/v1/rollup', methods=['GET'])
+@cached_response(CLEANED_CSV)
+def api_v1_rollup():
+    """
+    Aggregates from the rollup cube.
+
+    ?group_by=year,university&university=A&university=B&metrics=...&stats=mean,max
+    Dimension filters may repeat; metrics default to all, stats to mean.
+    """
+    filters = {d: request.args.getlist(d) for d in DIMENSIONS if request.args.getlist(d)}
+    try:
+        result = rollup(
+            CLEANED_CSV,
+            group_by=_csv_arg('group_by'),
+            filters=filters,
+            metrics=_csv_arg('metrics') or None,
+            stats=_csv_arg('stats') or ('mean',),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e), 'dimensions': DIMENSIONS, 'stats': list(ROLLUP_STATS)}), 400
+    return json_response(frame_payload(result))
+
+@app.route('/api/v1/projections', methods=['GET'])
+@cached_response(CLEANED_CSV)
+def api_v1_projections():
+    """Salary projections with the /function5 filters"""
+    trend_filter = request.args.get('trend_filter', 'all')
+    limit = request.args.get('limit')
+    try:
+        limit = int(limit) if limit else None
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    projections = calculate_salary_projections(
+        university_filter=request.args.get('university') or None,
+        degree_filter=request.args.get('degree') or None,
+        trend_filter=trend_filter,
+        limit=limit
+    )
+    return json_response(frame_payload(projections))
+
+@app.route('/api/cache/stats', methods=['GET'])
+def api_cache_stats():
+    """Hit/miss counters and size of this worker's response cache"""
+    if response_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(response_cache.stats(), enabled=True))
+
+MAX_JOB_WAIT = 10
+
+@app.route('/api/v1/jobs/<kind>', methods=['POST'])
+def api_v1_submit_job(kind):
+    """Run projections or rankings in the analysis pool; poll the returned job for the result"""
+    body = request.get_json(silent=True)
+    if body is not None and not isinstance(body, dict):
+        return jsonify({'error': 'JSON body must be an object'}), 400
+    params = body or request.args.to_dict()
+    try:
+        job = job_manager.submit(kind, params)
+    except JobQueueFull as e:
+        response = jsonify({'error': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    location = f'/api/v1/jobs/{job.id}'
+    return jsonify(dict(job.describe(), location=location, result=f'{location}/result')), 202, {'Location': location}
+
+@app.route('/api/v1/jobs/<job_id>', methods=['GET'])
+def api_v1_job_status(job_id):
+    """Status of a submitted job"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.describe())
+
+@app.route('/api/v1/jobs/<job_id>/result', methods=['GET'])
+def api_v1_job_result(job_id):
+    """Result of a job: 200 when done, 202 while pending (?wait=seconds long-polls)"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), MAX_JOB_WAIT)
+    except ValueError:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+
+    try:
+        body = job_manager.result(job, wait)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if body is None:
+        return jsonify(job.describe()), 202, {'Retry-After': '1'}
+    return app.response_class(body, mimetype='application/json')
+
+@app.route('/api/v1/jobs', methods=['GET'])
+def api_v1_job_stats():
+    """Pool size, pending jobs and coalescing/back-pressure counters"""
+    return jsonify(job_manager.stats())
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once this worker's datasets and tables are built, 503 before"""
+    info = warmup_state.describe()
+    return jsonify(info), 200 if info['ready'] else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Request/stage timing histograms and cache counters in Prometheus text format"""
+    extra = []
+    if response_cache is not None:
+        stats = response_cache.stats()
+        for name in ('hits', 'misses', 'stores', 'evictions'):
+            extra += [f'# TYPE ges_response_cache_{name}_total counter',
+                      f'ges_response_cache_{name}_total {stats[name]}']
+    jobs = job_manager.stats()
+    for name in ('submitted', 'coalesced', 'rejected'):
+        extra += [f'# TYPE ges_jobs_{name}_total counter', f'ges_jobs_{name}_total {jobs[name]}']
+    extra += ['# TYPE ges_jobs_pending gauge', f'ges_jobs_pending {jobs["pending"]}']
+    return app.response_class(render_metrics(extra), mimetype='text/plain; version=0.0.4')
+
+TABLE_DATASETS = {
+    'cleaned': CLEANED_CSV,
+    'raw': RAW_CSV,
+    'grouped': GROUPED_CSV,
+}
+# Served as the text in the file rather than as typed values
+TEXT_DATASETS = {'raw'}
+TABLE_PARAMS = {'offset', 'limit', 'columns', 'sort', 'order'}
+MAX_TABLE_LIMIT = 500
+
+@app.route('/api/table/<dataset>', methods=['GET'])
+def api_table(dataset):
+    """
+    Paginated preview of a dataset.
+
+    Query params: offset, limit, columns (comma separated), sort, order (asc/desc);
+    any other param named after a column is an exact-match filter. Params
+    starting with '_' (e.g. the cache buster `_=123`) are ignored.
+    """
+    file_path = TABLE_DATASETS.get(dataset)
+    if file_path is None or not os.path.exists(file_path):
+        return jsonify({'error': f'Unknown dataset: {dataset}'}), 404
+
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(MAX_TABLE_LIMIT, max(0, int(request.args.get('limit', 50))))
+    except ValueError:
+        return jsonify({'error': 'offset and limit must be integers'}), 400
+
+    columns = request.args.get('columns')
+    columns = [c.strip() for c in columns.split(',') if c.strip()] if columns else None
+    filters = {k: v for k, v in request.args.items() if k not in TABLE_PARAMS and not k.startswith('_')}
+
+    try:
+        result = query_table(
+            file_path,
+            offset=offset,
+            limit=limit,
+            columns=columns,
+            filters=filters,
+            sort=request.args.get('sort') or None,
+            descending=request.args.get('order', 'asc').lower() == 'desc',
+            as_text=dataset in TEXT_DATASETS,
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    result['dataset'] = dataset
+    return jsonify(result)
+
 @app.route('/data/<filename>')
 def serve_csv(filename):
-    """Serve CSV files from the parent directory"""
+    """Serve CSV files from the data directory"""
     try:
-        # Get the absolute path to the parent directory
-        base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        file_path = os.path.join(base_dir, filename)
+        file_path = os.path.join(DATA_DIR, filename)
         
         if os.path.exists(file_path) and filename.endswith('.csv'):
-            return send_file(file_path, mimetype='text/csv', as_attachment=False, download_name=filename)
+            digest = file_digest(file_path)
+            last_modified = os.path.getmtime(file_path)
+
+            # Byte ranges refer to the plain file, so only full responses are compressed
+            variant = None
+            encoding = None
+            if request.range is None:
+                encoding = request.accept_encodings.best_match(available_encodings() + ['identity'])
+                if encoding in available_encodings():
+                    try:
+                        variant = ensure_variant(file_path, encoding, digest)
+                    except OSError:
+                        variant = None
+
+            # send_file answers If-None-Match / If-Modified-Since with 304 and Range with 206
+            if variant:
+                response = send_file(variant, mimetype='text/csv', as_attachment=False, download_name=filename,
+                                     etag=f'{digest}-{encoding}', last_modified=last_modified)
+                response.headers['Content-Encoding'] = encoding
+            else:
+                response = send_file(file_path, mimetype='text/csv', as_attachment=False, download_name=filename,
+                                     etag=digest, last_modified=last_modified)
+
+            response.headers['Vary'] = 'Accept-Encoding'
+            response.headers['Cache-Control'] = 'no-cache'
+            # Uncompressed size, for clients that only see the encoded Content-Length
+            response.headers['X-Original-Length'] = str(os.path.getsize(file_path))
+            return response
         else:
             return jsonify({'error': f'File not found: {filename}'}), 404
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
+    start_warm_up()
     app.run(debug=True, host='0.0.0.0', port=80)
@@ -0,0 +1,93 @@
+import glob
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+from dataset_store import DATA_DIR, file_digest
+
+# Precompressed copies live outside the data directory so they are never served by name
+CACHE_DIR = os.path.join(DATA_DIR, '.cache', 'compressed')
+
+# Server preference when the client accepts several encodings equally
+_EXTENSIONS = {'br': 'br', 'gzip': 'gz'}
+
+
+def _compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def available_encodings():
+    """Content encodings this worker can produce, in order of preference."""
+    return [e for e in _EXTENSIONS if e != 'br' or brotli is not None]
+
+
+def variant_path(file_path, encoding, digest):
+    """Path of the compressed copy of one version (content hash) of a file."""
+    return os.path.join(CACHE_DIR, f'{os.path.basename(file_path)}.{digest}.{_EXTENSIONS[encoding]}')
+
+
+def ensure_variant(file_path, encoding, digest=None):
+    """
+    Get the path of a precompressed copy of a file, building it if missing.
+
+    Copies are named after the content hash of the file they were compressed
+    from, so a file replaced by other content (even with an older mtime) never
+    gets a copy of its previous version.
+
+    Args:
+        file_path: Path to the original file
+        encoding: 'br' or 'gzip'
+        digest: Content hash of the version wanted (default: the current file's)
+
+    Returns:
+        str: Path to the compressed copy, or None if the encoding is unavailable
+        or the file no longer has content `digest`
+    """
+    if encoding not in available_encodings():
+        return None
+
+    digest = digest or file_digest(file_path)
+    target = variant_path(file_path, encoding, digest)
+    if os.path.exists(target):
+        return target
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    # Name the copy after what was actually read, in case the file just changed
+    actual = hashlib.sha1(raw).hexdigest()
+    built = variant_path(file_path, encoding, actual)
+
+    # Write then rename so concurrent workers never serve a half-written file
+    tmp = f'{built}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_compress(raw, encoding))
+    os.replace(tmp, built)
+
+    # Copies of earlier versions are never served again
+    pattern = f'{glob.escape(os.path.basename(file_path))}.*.{_EXTENSIONS[encoding]}'
+    for old in glob.glob(os.path.join(glob.escape(CACHE_DIR), pattern)):
+        if old != built:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return built if actual == digest else None
+
+
+def precompress_directory(directory=DATA_DIR, suffix='.csv'):
+    """Build every compressed variant for the files served from a directory."""
+    built = []
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if name.endswith(suffix) and os.path.isfile(path):
+            for encoding in available_encodings():
+                built.append(ensure_variant(path, encoding))
+    return built
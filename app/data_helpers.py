@@ -1,4 +1,120 @@
+import hashlib
+import json
+
+import numpy as np
 import pandas as pd
+from dataset_store import dataset_version, get_dataset, get_derived, equals_mask, exact_metrics
+from instrumentation import timed
+from sql_backend import sql_table, sql_derived, read_sql, select_rows, count_rows, table_columns
+
+def _build_dimension_index(df):
+    """
+    Build the university -> school -> degree -> years hierarchy for the cleaned
+    dataset, plus flat lookup tables so each dropdown query is a dict hit.
+    """
+    rows = (
+        df[['university', 'school', 'degree', 'year']]
+        .dropna(subset=['university', 'school', 'degree'])
+        .drop_duplicates()
+    )
+    tree = {}
+    for uni, school, degree, year in rows.itertuples(index=False):
+        tree.setdefault(uni, {}).setdefault(school, {}).setdefault(degree, set()).add(int(year))
+
+    tree = {
+        uni: {
+            school: {degree: sorted(years) for degree, years in sorted(degrees.items())}
+            for school, degrees in sorted(schools.items())
+        }
+        for uni, schools in sorted(tree.items())
+    }
+
+    schools = {}
+    degrees = {}
+    for uni, uni_schools in tree.items():
+        schools[uni] = list(uni_schools)
+        all_degrees = set()
+        for school, school_degrees in uni_schools.items():
+            degrees[(uni, school)] = list(school_degrees)
+            all_degrees.update(school_degrees)
+        degrees[(uni, None)] = sorted(all_degrees)
+
+    return {
+        'tree': tree,
+        'universities': list(tree),
+        'schools': schools,
+        'degrees': degrees,
+    }
+
+def _build_grouped_index(df):
+    """
+    Build the university -> degree -> years hierarchy for the grouped salary
+    dataset. Order of appearance in the file is kept, as the endpoints always did.
+    """
+    tree = {}
+    for uni, degree, year in df[['university', 'degree', 'year']].itertuples(index=False):
+        years = tree.setdefault(uni, {}).setdefault(degree, [])
+        if int(year) not in years:
+            years.append(int(year))
+
+    return {
+        'tree': tree,
+        'degrees': {uni: list(uni_degrees) for uni, uni_degrees in tree.items()},
+        'years': {
+            (uni, degree): years
+            for uni, uni_degrees in tree.items()
+            for degree, years in uni_degrees.items()
+        },
+    }
+
+def get_dimension_index(file_path):
+    """Get the dimension index of the cleaned dataset (rebuilt when the file changes)."""
+    table = sql_table(file_path)
+    if table:
+        # Only the distinct combinations leave the database
+        return sql_derived(f'{table}:dimension_index', lambda: _build_dimension_index(
+            read_sql(f'SELECT DISTINCT university, school, degree, year FROM {table}')))
+    return get_derived(file_path, 'dimension_index', _build_dimension_index)
+
+def get_grouped_index(file_path):
+    """Get the dimension index of the grouped salary dataset (rebuilt when the file changes)."""
+    table = sql_table(file_path)
+    if table:
+        return sql_derived(f'{table}:grouped_index', lambda: _build_grouped_index(
+            read_sql(f'SELECT university, degree, year FROM {table} ORDER BY rowid')))
+    return get_derived(file_path, 'grouped_index', _build_grouped_index)
+
+_payload_cache = {}
+
+def get_dimension_payload(cleaned_path, grouped_path):
+    """
+    Get the whole dropdown hierarchy as a serialised JSON document.
+
+    Args:
+        cleaned_path: Path to the cleaned CSV file
+        grouped_path: Path to the grouped salary analysis CSV file
+
+    Returns:
+        tuple: (json_text, etag) where the ETag changes with either dataset
+    """
+    etag = hashlib.sha1(
+        f'{dataset_version(cleaned_path)}:{dataset_version(grouped_path)}'.encode()
+    ).hexdigest()
+    if etag not in _payload_cache:
+        cleaned = get_dimension_index(cleaned_path)
+        grouped = get_grouped_index(grouped_path)
+        payload = json.dumps({
+            'universities': cleaned['universities'],
+            'cleaned': cleaned['tree'],
+            'salary_spread': grouped['tree'],
+        }, separators=(',', ':'))
+        _payload_cache.clear()
+        _payload_cache[etag] = payload
+    return _payload_cache[etag], etag
+
+def get_universities(file_path):
+    """Get the sorted list of universities in the cleaned dataset."""
+    return list(get_dimension_index(file_path)['universities'])
 
 def get_schools_for_university(file_path, university):
     """
@@ -14,9 +130,7 @@ def get_schools_for_university(file_path, university):
     if not university:
         return []
     
-    df = pd.read_csv(file_path)
-    schools = sorted(df[df['university'] == university]['school'].unique().tolist())
-    return schools
+    return list(get_dimension_index(file_path)['schools'].get(university, []))
 
 def get_degrees_for_university_school(file_path, university, school=None):
     """
@@ -33,11 +147,118 @@ def get_degrees_for_university_school(file_path, university, school=None):
     if not university:
         return []
     
-    df = pd.read_csv(file_path)
-    filtered = df[df['university'] == university]
-    
-    if school:
-        filtered = filtered[filtered['school'] == school]
-    
-    degrees = sorted(filtered['degree'].unique().tolist())
-    return degrees
+    degrees = get_dimension_index(file_path)['degrees']
+    return list(degrees.get((university, school or None), []))
+
+def get_text_dataset(file_path):
+    """
+    A dataset exactly as its CSV holds it, cached per dataset version.
+
+    Every value stays a string: no type coercion, and markers such as 'na' or
+    empty cells are kept rather than becoming nulls.
+    """
+    return get_derived(file_path, 'text_frame', lambda _: pd.read_csv(file_path, dtype=str, keep_default_na=False))
+
+def _sort_order(file_path, column, descending, as_text=False):
+    """Row positions of a dataset sorted by one column, cached per dataset version."""
+    def build(df):
+        if as_text:
+            df = get_text_dataset(file_path)
+            # Numbers sort by value; text that is not a number (e.g. 'na') goes last
+            numbers = pd.to_numeric(df[column], errors='coerce')
+            key = numbers if numbers.notna().any() else df[column]
+        else:
+            key = df[column]
+        order = key.sort_values(ascending=not descending, kind='mergesort', na_position='last')
+        return df.index.get_indexer(order.index)
+    return get_derived(file_path, f'sort_order:{column}:{descending}:{as_text}', build)
+
+@timed('filter')
+def query_table(file_path, offset=0, limit=50, columns=None, filters=None, sort=None, descending=False,
+                as_text=False):
+    """
+    Get one page of a dataset with optional projection, filters and sort.
+
+    Args:
+        file_path: Path to the CSV file
+        offset: Index of the first row to return
+        limit: Maximum number of rows to return
+        columns: Column names to return (optional, defaults to all)
+        filters: Dict of column -> value for exact-match filters (optional)
+        sort: Column to sort by (optional, defaults to file order)
+        descending: Sort direction
+        as_text: Serve the values as written in the file (see get_text_dataset)
+
+    Returns:
+        dict: columns, rows (list of lists), total matching rows, offset, limit
+
+    Raises:
+        ValueError: If a column is unknown or a filter value has the wrong type
+    """
+    table = None if as_text else sql_table(file_path)
+    if table:
+        return _sql_query_table(table, offset, limit, columns, filters, sort, descending)
+
+    df = get_text_dataset(file_path) if as_text else get_dataset(file_path)
+
+    columns = list(columns) if columns else list(df.columns)
+    unknown = [c for c in columns + list(filters or {}) + ([sort] if sort else []) if c not in df.columns]
+    if unknown:
+        raise ValueError(f"Unknown columns: {sorted(set(unknown))}")
+
+    if sort:
+        positions = _sort_order(file_path, sort, bool(descending), as_text)
+    else:
+        positions = np.arange(len(df))
+
+    if filters:
+        mask = np.ones(len(df), dtype=bool)
+        for col, value in filters.items():
+            series = df[col]
+            if pd.api.types.is_numeric_dtype(series):
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Filter on '{col}' expects a number")
+            mask &= equals_mask(df, col, value)
+        positions = positions[mask[positions]]
+
+    page = df.iloc[positions[offset:offset + limit]][columns]
+    compact = [c for c in columns if page[c].dtype == np.float32]
+    if compact:
+        page = page.assign(**exact_metrics(page[compact]))
+    rows = page.astype(object).where(page.notna(), None).values.tolist()
+
+    return {
+        'columns': columns,
+        'rows': rows,
+        'total': int(len(positions)),
+        'offset': offset,
+        'limit': limit,
+    }
+
+def _sql_query_table(table, offset, limit, columns, filters, sort, descending):
+    """query_table with the filter, sort and paging done by the database."""
+    declared = table_columns(table)
+    columns = list(columns) if columns else list(declared)
+    unknown = [c for c in columns + list(filters or {}) + ([sort] if sort else []) if c not in declared]
+    if unknown:
+        raise ValueError(f"Unknown columns: {sorted(set(unknown))}")
+
+    typed = {}
+    for col, value in (filters or {}).items():
+        if declared[col] in ('REAL', 'INTEGER'):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Filter on '{col}' expects a number")
+        typed[col] = value
+
+    _, rows = select_rows(table, columns, typed, sort, bool(descending), limit, offset)
+    return {
+        'columns': columns,
+        'rows': [list(row) for row in rows],
+        'total': count_rows(table, typed),
+        'offset': offset,
+        'limit': limit,
+    }
@@ -0,0 +1,290 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional; without it everything is read from CSV
+    pa = feather = None
+
+# Schema metadata key holding the SHA-1 of the CSV a Feather copy was written from
+COLUMNAR_SOURCE_KEY = b'source_sha1'
+
+try:
+    from instrumentation import span
+except ImportError:  # imported as app.dataset_store by offline scripts: no request timing
+    from contextlib import nullcontext as span
+
+# All datasets live next to the app package, regardless of the working directory.
+# GES_DATA_DIR points the app at another copy of the CSVs (e.g. a scaled dataset).
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.abspath(os.environ.get('GES_DATA_DIR', BASE_DIR))
+RAW_CSV = os.path.join(DATA_DIR, 'raw.csv')
+CLEANED_CSV = os.path.join(DATA_DIR, 'cleaned.csv')
+GROUPED_CSV = os.path.join(DATA_DIR, 'grouped_salary_analysis.csv')
+PROJECTIONS_CSV = os.path.join(DATA_DIR, 'function5_data.csv')
+
+NUMERIC_COLS = [
+    "employment_rate_overall",
+    "employment_rate_ft_perm",
+    "basic_monthly_mean",
+    "basic_monthly_median",
+    "gross_monthly_mean",
+    "gross_monthly_median",
+    "gross_mthly_25_percentile",
+    "gross_mthly_75_percentile",
+]
+
+DERIVED_NUMERIC_COLS = ["IQR", "IQR_ratio"]
+
+# Repeated text columns, held as categoricals (integer codes) in memory and on disk
+DIMENSION_COLS = ["university", "school", "degree"]
+
+# Survey metrics carry at most 2 decimals, so float32 storage loses nothing
+# once values are rounded back to this many places (see exact_metrics)
+METRIC_DECIMALS = 2
+
+
+class _Entry:
+    """One loaded dataset plus everything derived from it."""
+
+    def __init__(self, path, signature, digest, frame):
+        self.path = path
+        self.signature = signature
+        self.digest = digest
+        self.frame = frame
+        self.derived = {}
+        self.building = {}  # name -> lock held while that value is built
+
+
+_entries = {}
+_lock = threading.RLock()
+
+
+def _signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_digests = {}
+
+
+def file_digest(file_path) -> str:
+    """
+    Content hash (SHA-1 hex) of any file, recomputed only when its mtime/size change.
+
+    Usable as a strong validator for files that are served as-is.
+    """
+    path = os.path.abspath(file_path)
+    signature = _signature(path)
+    with _lock:
+        cached = _digests.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, _digest(path))
+            _digests[path] = cached
+        return cached[1]
+
+
+def normalise_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Coerce the year and metric columns once so callers never have to.
+
+    Frames are kept compact: int16 years, float32 survey metrics and
+    categorical dimension columns. Derived ratios (IQR, IQR_ratio) stay float64.
+    """
+    if "year" in df.columns:
+        year = pd.to_numeric(df["year"], errors="coerce")
+        df["year"] = year.astype("int16") if year.notna().all() else year.astype("Int16")
+    for col in NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float32")
+    for col in DERIVED_NUMERIC_COLS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    for col in DIMENSION_COLS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def exact_metrics(values):
+    """
+    Upcast float32 metric values (Series or DataFrame) to float64 for arithmetic.
+
+    Rounding to METRIC_DECIMALS removes the float32 representation error, so
+    results match what the original text values would give.
+    """
+    return values.astype("float64").round(METRIC_DECIMALS)
+
+
+def equals_mask(df: pd.DataFrame, column, value) -> np.ndarray:
+    """
+    Boolean mask of rows where a column equals a value.
+
+    For categorical columns the value is looked up once and the comparison
+    runs on the integer codes instead of comparing strings row by row.
+    """
+    series = df[column]
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        code = series.cat.categories.get_indexer([value])[0]
+        if code < 0:
+            return np.zeros(len(df), dtype=bool)
+        return series.cat.codes.to_numpy() == code
+    return (series == value).to_numpy(dtype=bool, na_value=False)
+
+
+def columnar_path(csv_path):
+    """Path of the Feather (Arrow IPC) copy that sits next to a CSV file."""
+    return os.path.splitext(os.path.abspath(csv_path))[0] + '.feather'
+
+
+def write_columnar(df: pd.DataFrame, csv_path, digest=None) -> str:
+    """
+    Write a typed, uncompressed Feather copy of a dataset next to its CSV.
+
+    Columns are stored with the compact dtypes from normalise_frame. The file is memory-mappable,
+    so every worker on a host shares the same pages. The content hash of the CSV is stored in
+    the schema metadata; the copy is only used while the CSV still has that content.
+
+    Args:
+        df: DataFrame that was written to csv_path
+        csv_path: Path of the CSV file the copy belongs to
+        digest: Content hash of the CSV (default: hashed from csv_path)
+
+    Returns:
+        str: Path of the Feather file, or None when pyarrow is not installed
+    """
+    if feather is None:
+        return None
+    target = columnar_path(csv_path)
+    typed = normalise_frame(df.copy())
+    table = pa.Table.from_pandas(typed.reset_index(drop=True), preserve_index=False)
+    digest = digest or file_digest(csv_path)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), COLUMNAR_SOURCE_KEY: digest.encode()})
+
+    # Write then rename so readers never see a partial file
+    tmp = f'{target}.{os.getpid()}.tmp'
+    feather.write_feather(table, tmp, compression='uncompressed')
+    os.replace(tmp, target)
+    return target
+
+
+def _read(path, digest):
+    columnar = columnar_path(path)
+    if feather is not None and os.path.exists(columnar):
+        try:
+            table = feather.read_table(columnar, memory_map=True)
+            # A copy written from other content (e.g. an older CSV) is stale
+            if (table.schema.metadata or {}).get(COLUMNAR_SOURCE_KEY) == digest.encode():
+                return normalise_frame(table.to_pandas())
+        except (OSError, ValueError):
+            pass  # unreadable cache: fall back to the CSV
+
+    df = normalise_frame(pd.read_csv(path))
+    # Leave a columnar copy behind so the next worker or reload skips parsing
+    try:
+        write_columnar(df, path, digest)
+    except OSError:
+        pass
+    return df
+
+
+def _entry(file_path):
+    path = os.path.abspath(file_path)
+    signature = _signature(path)
+    with _lock:
+        entry = _entries.get(path)
+        if entry is not None and entry.signature == signature:
+            return entry
+
+        with span('load'):
+            # mtime/size changed: only reload when the content really differs
+            digest = file_digest(path)
+            if entry is not None and entry.digest == digest:
+                entry.signature = signature
+                return entry
+
+            # Build the new entry completely before swapping it in
+            entry = _Entry(path, signature, digest, _read(path, digest))
+            _entries[path] = entry
+            return entry
+
+
+def get_dataset(file_path) -> pd.DataFrame:
+    """
+    Get the shared, normalised DataFrame for a CSV file.
+
+    The file is parsed once per worker and re-read only when its content
+    changes. The returned frame is shared: callers must not modify it in place.
+
+    Args:
+        file_path: Path to the CSV file
+
+    Returns:
+        DataFrame with numeric columns already coerced
+    """
+    return _entry(file_path).frame
+
+
+def dataset_version(file_path) -> str:
+    """
+    Content hash of the current version of a dataset.
+
+    Equal to the digest of the frame get_dataset would return, but the file
+    is not parsed, so versions are cheap with the SQL backend too.
+    """
+    return file_digest(file_path)
+
+
+def get_derived(file_path, name, builder):
+    """
+    Get a value computed from a dataset, memoised per dataset version.
+
+    Args:
+        file_path: Path to the CSV file the value is derived from
+        name: Key identifying the derived value
+        builder: Callable taking the dataset DataFrame and returning the value
+
+    Returns:
+        The cached value, rebuilt automatically when the file changes
+
+    The builder runs outside the store lock, so other datasets and values stay
+    available meanwhile; concurrent callers of the same value wait for a single build.
+    """
+    entry = _entry(file_path)
+    with _lock:
+        if name in entry.derived:
+            return entry.derived[name]
+        building = entry.building.setdefault(name, threading.Lock())
+
+    with building:
+        with _lock:
+            if name in entry.derived:
+                return entry.derived[name]
+        with span('derive'):
+            value = builder(entry.frame)
+        with _lock:
+            # A value built from a version that has since been replaced is not kept
+            if _entries.get(entry.path) is entry:
+                entry.derived[name] = value
+                entry.building.pop(name, None)
+        return value
+
+
+def clear():
+    """Drop every loaded dataset (mainly useful for scripts and tests)."""
+    with _lock:
+        _entries.clear()
+        _digests.clear()
@@ -1,7 +1,103 @@
 import pandas as pd
 import numpy as np
-from sklearn.linear_model import LinearRegression
+from dataset_store import CLEANED_CSV, PROJECTIONS_CSV, get_derived, write_columnar, exact_metrics
+from instrumentation import timed
 
+# Parameters for projection
+N_YEARS = 5  # Use last 5 years for linear trend
+FORECAST_YEAR = 2024  # Next year to forecast
+
+RESULT_COLUMNS = [
+    'degree', 'university', 'method', 'last_year', 'last_actual_median',
+    'forecast_year', 'predicted_median_2024', 'change_amount', 'change_percentage',
+    'trend_slope', 'years_used', 'data_range',
+]
+
+def batch_linear_trends(data, n_years, forecast_year):
+    """Fit a least-squares line per degree-university group in one vectorised pass
+
+    Each group uses its last `n_years` rows (by year). Slopes and intercepts come
+    from closed-form grouped sums, so no per-group model objects are created.
+
+    Args:
+        data: Cleaned dataset with degree, university, year and gross_monthly_median
+        n_years: Number of most recent rows per group used for the fit
+        forecast_year: Year to extrapolate to
+
+    Returns:
+        DataFrame with one projection row per group having at least 2 data points
+    """
+    keys = ['degree', 'university']
+    d = data[keys + ['year', 'gross_monthly_median']].dropna()
+
+    # Stable sort keeps the original row order for repeated years within a group
+    d = d.sort_values(keys + ['year'], kind='mergesort')
+    d = d[d.groupby(keys, sort=False).cumcount(ascending=False) < n_years]
+    if d.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    codes = d.groupby(keys, sort=False).ngroup().to_numpy()
+    x = d['year'].to_numpy(dtype=float)
+    y = exact_metrics(d['gross_monthly_median']).to_numpy()
+    groups = codes[-1] + 1
+
+    n = np.bincount(codes, minlength=groups)
+    x_mean = np.bincount(codes, weights=x, minlength=groups) / np.maximum(n, 1)
+    y_mean = np.bincount(codes, weights=y, minlength=groups) / np.maximum(n, 1)
+    dx = x - x_mean[codes]
+    dy = y - y_mean[codes]
+    sxx = np.bincount(codes, weights=dx * dx, minlength=groups)
+    sxy = np.bincount(codes, weights=dx * dy, minlength=groups)
+
+    # A group whose rows all share one year has no trend (flat line at the mean)
+    slope = np.divide(sxy, sxx, out=np.zeros(groups), where=sxx > 0)
+    intercept = y_mean - slope * x_mean
+    predicted = intercept + slope * forecast_year
+
+    # Rows are sorted by year, so each group's last row holds its latest year;
+    # the first row carrying that year supplies the last actual value
+    last_row = np.r_[np.flatnonzero(np.diff(codes)), len(codes) - 1]
+    first_row = np.r_[0, last_row[:-1] + 1]
+    last_year = x[last_row]
+    at_last_year = np.flatnonzero(x == last_year[codes])
+    first_at_last_year = at_last_year[np.r_[True, np.diff(codes[at_last_year]) != 0]]
+    last_actual = y[first_at_last_year]
+
+    change_amount = predicted - last_actual
+    change_percentage = change_amount / last_actual * 100
+
+    group_keys = d.iloc[last_row][keys].reset_index(drop=True)
+    first_year = x[first_row].astype(int)
+    data_range = [f'{lo}-{hi}' for lo, hi in zip(first_year, last_year.astype(int))]
+
+    results_df = pd.DataFrame({
+        'degree': group_keys['degree'],
+        'university': group_keys['university'],
+        'method': [f'Linear Trend (last {k} years: {r})' for k, r in zip(n, data_range)],
+        'last_year': last_year.astype(int),
+        'last_actual_median': np.round(last_actual, 2),
+        'forecast_year': forecast_year,
+        'predicted_median_2024': np.round(predicted, 2),
+        'change_amount': np.round(change_amount, 2),
+        'change_percentage': np.round(change_percentage, 2),
+        'trend_slope': np.round(slope, 2),
+        'years_used': n,
+        'data_range': data_range,
+    }, columns=RESULT_COLUMNS)
+
+    # Not enough data for projection
+    return results_df[results_df['years_used'] >= 2].reset_index(drop=True)
+
+def _build_projection_table(data):
+    results_df = batch_linear_trends(data, N_YEARS, FORECAST_YEAR)
+    # Stable sort, so filtered subsets keep the same relative order
+    return results_df.sort_values('predicted_median_2024', ascending=False, kind='mergesort')
+
+def get_projection_table(file_path=CLEANED_CSV):
+    """Unfiltered projections sorted by predicted median, cached per dataset version"""
+    return get_derived(file_path, 'salary_projections', _build_projection_table)
+
+@timed('filter')
 def calculate_salary_projections(university_filter=None, degree_filter=None, trend_filter='all', limit=None):
     """Calculate salary projections using linear trend extrapolation
     
@@ -11,73 +107,8 @@ def calculate_salary_projections(university_filter=None, degree_filter=None, tre
         trend_filter: 'all', 'increasing', or 'decreasing' (default: 'all')
         limit: Maximum number of results to return (optional)
     """
-    # Load the dataset
-    data = pd.read_csv('../cleaned.csv')
-
-    # Get unique degree-university combinations
-    degree_university_combos = data.groupby(['degree', 'university']).size().reset_index()[['degree', 'university']]
-
-    # Parameters for projection
-    N_YEARS = 5  # Use last 5 years for linear trend
-    FORECAST_YEAR = 2024  # Next year to forecast
-
-    results = []
-
-    for _, row in degree_university_combos.iterrows():
-        degree = row['degree']
-        uni = row['university']
-        
-        # Filter data for this specific degree and university
-        subset = data[(data['degree'] == degree) & (data['university'] == uni)].copy()
-        subset = subset.sort_values('year')
-        
-        # Get the last N years of data
-        last_n_years = subset.tail(N_YEARS)
-        
-        if len(last_n_years) < 2:
-            # Not enough data for projection
-            continue
-        
-        # Prepare data for linear regression
-        X = last_n_years[['year']].values
-        y = last_n_years['gross_monthly_median'].values
-        
-        # Fit linear regression model
-        model = LinearRegression()
-        model.fit(X, y)
-        
-        # Make prediction for 2024
-        predicted_2024 = model.predict([[FORECAST_YEAR]])[0]
-        
-        # Get the last actual value (2023)
-        last_year = last_n_years['year'].max()
-        last_actual_value = last_n_years[last_n_years['year'] == last_year]['gross_monthly_median'].values[0]
-        
-        # Calculate change
-        change_amount = predicted_2024 - last_actual_value
-        change_percentage = (change_amount / last_actual_value) * 100
-        
-        # Get the slope (trend)
-        slope = model.coef_[0]
-        
-        # Store results
-        results.append({
-            'degree': degree,
-            'university': uni,
-            'method': f'Linear Trend (last {len(last_n_years)} years: {last_n_years["year"].min()}-{last_year})',
-            'last_year': int(last_year),
-            'last_actual_median': round(last_actual_value, 2),
-            'forecast_year': FORECAST_YEAR,
-            'predicted_median_2024': round(predicted_2024, 2),
-            'change_amount': round(change_amount, 2),
-            'change_percentage': round(change_percentage, 2),
-            'trend_slope': round(slope, 2),
-            'years_used': len(last_n_years),
-            'data_range': f'{last_n_years["year"].min()}-{last_year}'
-        })
-
-    # Create DataFrame
-    results_df = pd.DataFrame(results)
+    # Full table is computed once per version of cleaned.csv; only filters run per call
+    results_df = get_projection_table()
 
     # Apply filters
     if university_filter:
@@ -91,19 +122,19 @@ def calculate_salary_projections(university_filter=None, degree_filter=None, tre
     elif trend_filter == 'decreasing':
         results_df = results_df[results_df['change_amount'] < 0]
     
-    # Sort by predicted median (descending)
-    results_df = results_df.sort_values('predicted_median_2024', ascending=False)
-    
+    # Already sorted by predicted median (descending)
     # Apply limit
     if limit:
         results_df = results_df.head(limit)
     
-    return results_df
+    # Callers get their own frame, never the cached one
+    return results_df.copy()
 
 if __name__ == '__main__':
     # When run as a script, save to CSV
     results_df = calculate_salary_projections()
-    results_df.to_csv('../function5_data.csv', index=False)
+    results_df.to_csv(PROJECTIONS_CSV, index=False)
+    write_columnar(results_df, PROJECTIONS_CSV)
 
     print(f"Projection analysis completed for {len(results_df)} degree-university combinations!")
     print(f"\nTop 5 projected salaries for 2024:")
@@ -0,0 +1,310 @@
+import bisect
+import cProfile
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, has_request_context, request, template_rendered, before_render_template
+
+# Not imported from dataset_store, which imports this module for its spans
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Configuration (environment variables, so every WSGI worker agrees)
+#   REQUEST_TIMING        on (default) or off
+#   PROFILE_REQUESTS      off (default), cprofile or pyinstrument
+#   PROFILE_THRESHOLD_MS  only requests slower than this are dumped
+#   PROFILE_DIR           directory the profile dumps are written to
+#   PROFILE_MAX_FILES     oldest dumps are removed beyond this count
+TIMING_ENABLED = os.environ.get('REQUEST_TIMING', 'on').lower() not in ('off', '0', 'false')
+PROFILER = os.environ.get('PROFILE_REQUESTS', 'off').lower()
+PROFILE_THRESHOLD_MS = float(os.environ.get('PROFILE_THRESHOLD_MS', 500))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(BASE_DIR, '.cache', 'profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
+# Histogram upper bounds in seconds (Prometheus convention, +Inf is implicit)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative histogram per label set, rendered in Prometheus text format."""
+
+    def __init__(self, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        """Record one observation (seconds) for a tuple of label values."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def _labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}' if pairs else ''
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, (list(counts), total, n)) for labels, (counts, total, n) in self._series.items())
+        for labels, (counts, total, n) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{self._labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{self._labels(labels)} {total:.6f}')
+            lines.append(f'{self.name}_count{self._labels(labels)} {n}')
+        return '\n'.join(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# Metrics are per process: with several workers, scrape each one (or sum in Prometheus)
+REQUEST_SECONDS = Histogram(
+    'ges_request_duration_seconds', 'Time spent handling a request.', ('endpoint', 'method', 'status'))
+STAGE_SECONDS = Histogram(
+    'ges_stage_duration_seconds', 'Exclusive time per request stage (load, derive, filter, ...).',
+    ('endpoint', 'stage'))
+_counters = {'ges_slow_requests_profiled_total': 0}
+_counters_lock = threading.Lock()
+
+
+class _RequestTimer:
+    """Per-request span stack; every stage accumulates its exclusive (self) time."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.stack = []
+
+    def push(self):
+        self.stack.append(0.0)  # time spent in nested spans
+
+    def pop(self, stage, elapsed):
+        nested = self.stack.pop()
+        self.stages[stage] = self.stages.get(stage, 0.0) + elapsed - nested
+        if self.stack:
+            self.stack[-1] += elapsed
+
+
+def _current_timer():
+    if not TIMING_ENABLED or not has_request_context():
+        return None
+    return g.get('_request_timer')
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a block of work as one stage of the current request.
+
+    Spans nest: an outer stage is only charged for time not spent in inner
+    ones, so the stages of a request add up to at most its total time.
+    Outside a request (scripts, benchmarks) this does nothing.
+
+    Args:
+        stage: Stage name, e.g. 'load', 'filter' or 'aggregate'
+    """
+    timer = _current_timer()
+    if timer is None:
+        yield
+        return
+    timer.push()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.pop(stage, time.perf_counter() - start)
+
+
+def timed(stage):
+    """Decorator form of span(): time every call of a function as `stage`."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _server_timing(stages, total):
+    parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in stages.items()]
+    parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
+
+
+def _pyinstrument_profiler():
+    # Imported on first use: only needed when PROFILE_REQUESTS=pyinstrument
+    try:
+        from pyinstrument import Profiler
+    except ImportError:  # pyinstrument is optional; cProfile is always available
+        return None
+    return Profiler
+
+
+class _RequestProfiler:
+    """One profiler at a time per process: cProfile cannot run concurrently in threads."""
+
+    _lock = threading.Lock()
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.profiler = None
+
+    def start(self):
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            profiler_class = _pyinstrument_profiler() if self.kind == 'pyinstrument' else None
+            if profiler_class is not None:
+                self.profiler = profiler_class()
+                self.profiler.start()
+            else:
+                self.kind = 'cprofile'
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+        except (RuntimeError, ValueError):
+            # Another profiling tool is active (e.g. a debugger)
+            self.profiler = None
+            self._lock.release()
+            return False
+        return True
+
+    def stop(self):
+        if self.profiler is None:
+            return
+        try:
+            if self.kind == 'pyinstrument':
+                self.profiler.stop()
+            else:
+                self.profiler.disable()
+        finally:
+            self._lock.release()
+
+    def dump(self, name):
+        """Write the profile to PROFILE_DIR and return its path."""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        if self.kind == 'pyinstrument':
+            path = os.path.join(PROFILE_DIR, f'{name}.html')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self.profiler.output_html())
+        else:
+            path = os.path.join(PROFILE_DIR, f'{name}.prof')
+            self.profiler.dump_stats(path)  # open with `python -m pstats` or snakeviz
+        _prune_profiles()
+        return path
+
+
+def _prune_profiles():
+    try:
+        paths = [os.path.join(PROFILE_DIR, n) for n in os.listdir(PROFILE_DIR)]
+    except OSError:
+        return
+    excess = len(paths) - PROFILE_MAX_FILES
+    if excess > 0:
+        paths.sort(key=os.path.getmtime)
+        for path in paths[:excess]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _profile_name(endpoint, elapsed):
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    safe = re.sub(r'[^A-Za-z0-9_.-]+', '_', endpoint or 'unknown')
+    return f'{stamp}-{os.getpid()}-{safe}-{elapsed * 1000:.0f}ms'
+
+
+def _before_request():
+    g._request_timer = _RequestTimer()
+    if PROFILER in ('cprofile', 'pyinstrument'):
+        profiler = _RequestProfiler(PROFILER)
+        if profiler.start():
+            g._request_profiler = profiler
+
+
+def _after_request(response):
+    timer = g.pop('_request_timer', None)
+    profiler = g.pop('_request_profiler', None)
+    if profiler is not None:
+        profiler.stop()
+    if timer is None:
+        return response
+
+    total = time.perf_counter() - timer.start
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_SECONDS.observe((endpoint, request.method, str(response.status_code)), total)
+    for stage, seconds in timer.stages.items():
+        STAGE_SECONDS.observe((endpoint, stage), seconds)
+    response.headers['Server-Timing'] = _server_timing(timer.stages, total)
+
+    if profiler is not None and total * 1000 >= PROFILE_THRESHOLD_MS:
+        try:
+            profiler.dump(_profile_name(endpoint, total))
+            with _counters_lock:
+                _counters['ges_slow_requests_profiled_total'] += 1
+        except OSError:
+            pass
+    return response
+
+
+def _render_started(sender, template, context, **extra):
+    timer = _current_timer()
+    if timer is not None:
+        timer.push()
+        g._render_start = time.perf_counter()
+
+
+def _render_finished(sender, template, context, **extra):
+    timer = _current_timer()
+    start = g.pop('_render_start', None)
+    if timer is not None and start is not None:
+        timer.pop('render', time.perf_counter() - start)
+
+
+def init_app(app):
+    """Register the timing hooks (and the optional slow-request profiler) on a Flask app."""
+    if not TIMING_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+
+
+def render_metrics(extra_lines=()):
+    """
+    All metrics of this process in Prometheus text exposition format.
+
+    Args:
+        extra_lines: Additional, already formatted metric lines to append
+
+    Returns:
+        str: The exposition text (ends with a newline)
+    """
+    lines = [REQUEST_SECONDS.render(), STAGE_SECONDS.render()]
+    with _counters_lock:
+        for name, value in _counters.items():
+            lines += [f'# TYPE {name} counter', f'{name} {value}']
+    lines += list(extra_lines)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,278 @@
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from dataset_store import CLEANED_CSV, dataset_version
+
+# Configuration (environment variables, so every WSGI worker agrees)
+#   JOB_WORKERS        processes in the analysis pool (per WSGI worker)
+#   JOB_MAX_PENDING    queued + running jobs accepted before submissions are refused
+#   JOB_RESULT_TTL     seconds a finished job (and its result) is kept
+#   JOB_START_METHOD   multiprocessing start method of the pool
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', JOB_WORKERS * 4))
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 600))
+# spawn: forking a threaded WSGI worker could copy locks held by other threads
+JOB_START_METHOD = os.environ.get('JOB_START_METHOD', 'spawn')
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TREND_FILTERS = ('all', 'increasing', 'decreasing')
+
+
+class JobQueueFull(Exception):
+    """Raised when the pool already has JOB_MAX_PENDING unfinished jobs."""
+
+
+# Tasks run inside the pool processes
+def _init_worker(app_dir):
+    # App modules use flat imports; each pool process keeps its own dataset store
+    if app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+
+
+def _run_projections(params):
+    from function5_projection import calculate_salary_projections
+    from json_api import dumps, frame_payload
+
+    projections = calculate_salary_projections(
+        university_filter=params['university'],
+        degree_filter=params['degree'],
+        trend_filter=params['trend_filter'],
+        limit=params['limit'],
+    )
+    return dumps(frame_payload(projections))
+
+
+def _run_rankings(params):
+    from json_api import dumps
+    from rankings import available_years, rankings
+
+    year = params['year'] or available_years(CLEANED_CSV)[-1]
+    result = rankings(
+        csv_path=CLEANED_CSV,
+        year=year,
+        n=params['n'],
+        mode=params['mode'],
+        group_by=params['group_by'],
+        include_most_improved=params['include_most_improved'],
+    )
+    return dumps(result)
+
+
+def _int_param(params, name, default=None):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be an integer')
+
+
+def _str_param(params, name, default=None):
+    value = params.get(name)
+    if value in (None, ''):
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f'{name} must be a string')
+    return value
+
+
+def _projection_params(params):
+    trend_filter = _str_param(params, 'trend_filter', 'all')
+    if trend_filter not in TREND_FILTERS:
+        raise ValueError(f'trend_filter must be one of {", ".join(TREND_FILTERS)}')
+    return {
+        'university': _str_param(params, 'university'),
+        'degree': _str_param(params, 'degree'),
+        'trend_filter': trend_filter,
+        'limit': _int_param(params, 'limit'),
+    }
+
+
+def _rankings_params(params):
+    return {
+        'year': _int_param(params, 'year'),
+        'n': _int_param(params, 'n', 10),
+        'mode': _str_param(params, 'mode', 'top'),
+        'group_by': _str_param(params, 'group_by', 'degree'),
+        'include_most_improved': str(params.get('include_most_improved')) in ('1', 'true', 'True'),
+    }
+
+
+# kind -> (parameter normaliser run in the web process, task run in the pool)
+JOB_KINDS = {
+    'projections': (_projection_params, _run_projections),
+    'rankings': (_rankings_params, _run_rankings),
+}
+
+
+class Job:
+    """One submitted computation; requests with the same key share it."""
+
+    def __init__(self, job_id, kind, params, future):
+        self.id = job_id
+        self.kind = kind
+        self.params = params
+        self.future = future
+        self.submitted = time.time()
+        self.finished = None
+
+    @property
+    def status(self):
+        if not self.future.done():
+            return 'running' if self.future.running() else 'queued'
+        return 'error' if self.future.exception() is not None else 'done'
+
+    def describe(self):
+        info = {'id': self.id, 'kind': self.kind, 'params': self.params, 'status': self.status,
+                'submitted': self.submitted}
+        if self.finished is not None:
+            info['finished'] = self.finished
+        if info['status'] == 'error':
+            info['error'] = str(self.future.exception())
+        return info
+
+
+class JobManager:
+    """
+    Bounded process pool for heavy analyses, with request coalescing.
+
+    A job is keyed by its kind, normalised parameters and the version of the
+    dataset it reads. Submitting a key that is queued, running or recently
+    finished returns the existing job instead of computing it again.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_pending=JOB_MAX_PENDING, result_ttl=JOB_RESULT_TTL,
+                 start_method=JOB_START_METHOD):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.start_method = start_method
+        self._executor = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.coalesced = 0
+        self.rejected = 0
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(APP_DIR,),
+            )
+        return self._executor
+
+    def _expire(self, now):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and now - job.finished > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _pending(self):
+        return sum(1 for job in self._jobs.values() if not job.future.done())
+
+    @staticmethod
+    def make_id(kind, params, version):
+        raw = json.dumps([kind, sorted(params.items()), version], separators=(',', ':'), default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+    def submit(self, kind, params):
+        """
+        Submit a job, or join an identical one already known.
+
+        Args:
+            kind: Key of JOB_KINDS
+            params: Raw request parameters (mapping of strings)
+
+        Returns:
+            Job
+
+        Raises:
+            ValueError: Unknown kind or invalid parameters
+            JobQueueFull: The pool is saturated; retry later
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f'Unknown job kind: {kind}')
+        normalise, task = JOB_KINDS[kind]
+        params = normalise(params)
+        job_id = self.make_id(kind, params, dataset_version(CLEANED_CSV))
+
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            job = self._jobs.get(job_id)
+            if job is not None and not (job.future.done() and isinstance(job.future.exception(), BrokenProcessPool)):
+                self.coalesced += 1
+                return job
+
+            if self._pending() >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull(f'{self.max_pending} jobs already pending')
+
+            try:
+                future = self._pool().submit(task, params)
+            except BrokenProcessPool:
+                # A pool process died (e.g. OOM): start a fresh pool once
+                self._executor = None
+                future = self._pool().submit(task, params)
+
+            job = Job(job_id, kind, params, future)
+            future.add_done_callback(lambda _: setattr(job, 'finished', time.time()))
+            self._jobs[job_id] = job
+            self.submitted += 1
+            return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._expire(time.time())
+            return self._jobs.get(job_id)
+
+    def result(self, job, wait=0):
+        """
+        Result bytes of a job, waiting up to `wait` seconds for it to finish.
+
+        Returns:
+            bytes, or None if the job is still queued/running
+
+        Raises:
+            The exception raised by the task, if it failed
+        """
+        try:
+            return job.future.result(timeout=wait)
+        except FutureTimeout:
+            return None
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'pending': sum(1 for s in statuses if s in ('queued', 'running')),
+                'finished': sum(1 for s in statuses if s in ('done', 'error')),
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+job_manager = JobManager()
+atexit.register(job_manager.shutdown)
@@ -0,0 +1,72 @@
+import json
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is the fallback
+    orjson = None
+
+from dataset_store import exact_metrics
+from instrumentation import span
+
+
+def _column_values(series: pd.Series):
+    """One column as something the encoder can write without per-row Python work."""
+    if series.dtype == np.float32:
+        series = exact_metrics(series)
+
+    values = series.to_numpy()
+    if values.dtype.kind in "iub":
+        return values if orjson else values.tolist()
+    if values.dtype.kind == "f":
+        if orjson:
+            return values  # orjson writes NaN as null
+        return np.where(np.isnan(values), None, values).tolist()
+
+    # Categorical / string columns
+    values = series.astype(object).to_numpy()
+    return np.where(pd.isna(values), None, values).tolist()
+
+
+def frame_payload(df: pd.DataFrame, columns=None) -> dict:
+    """
+    Column-oriented payload for a DataFrame.
+
+    Args:
+        df: DataFrame to serialise
+        columns: Columns to include (optional, defaults to all)
+
+    Returns:
+        dict: {"columns": [...], "data": {column: values}, "rows": n}
+    """
+    columns = list(columns) if columns is not None else list(df.columns)
+    with span("serialize"):
+        return {
+            "columns": columns,
+            "data": {c: _column_values(df[c]) for c in columns},
+            "rows": int(len(df)),
+        }
+
+
+def _default(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    """Serialise a payload, using orjson's native NumPy support when available."""
+    with span("serialize"):
+        if orjson is not None:
+            return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        return json.dumps(payload, separators=(",", ":"), default=_default).encode()
+
+
+def json_response(payload, status=200):
+    """Flask response with a payload encoded by dumps()."""
+    return current_app.response_class(dumps(payload), status=status, mimetype="application/json")
@@ -0,0 +1,374 @@
+import sys
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from dataset_store import CLEANED_CSV, get_derived, exact_metrics
+from instrumentation import timed
+from rollup import DIMENSIONS, group_keys, normalise_filters, cell_mask
+
+# Salary percentile columns of the cleaned dataset, in quantile order
+PERCENTILE_COLS = ["gross_mthly_25_percentile", "gross_monthly_median", "gross_mthly_75_percentile"]
+SPREAD_COLS = PERCENTILE_COLS + ["IQR", "IQR_ratio"]
+
+# Compression (t-digest delta): a sketch keeps at most about DELTA / 2 centroids,
+# smallest near the tails. Mid-distribution centroids span about pi / DELTA of the mass.
+DELTA = 100
+
+# Groups of at most this many survey rows get the exact quartiles of their
+# rows' mixture instead of the sketch estimate: pooling few rows' points is
+# where the sketch errs most (up to about 3% at 2-11 rows). Larger groups stay
+# within MAX_RELATIVE_ERROR of the exact mixture at every level.
+EXACT_ROWS = 32
+MAX_RELATIVE_ERROR = 0.005
+
+QUARTILES = [0.25, 0.5, 0.75]
+
+# Each survey row becomes weighted points along a piecewise-linear quantile
+# function through its quartiles. Points are centred every 1/16 of the mass, so
+# q = .25, .5 and .75 fall exactly on a point (a single row reproduces its
+# quartiles); the half-weight end points carry the tails.
+_STEP = 1 / 16
+_ROW_WEIGHTS = np.r_[_STEP / 2, np.full(15, _STEP), _STEP / 2]
+_ROW_CENTRES = np.cumsum(_ROW_WEIGHTS) - _ROW_WEIGHTS / 2
+
+
+def _row_knots(percentiles: np.ndarray) -> np.ndarray:
+    """
+    Values of each row's quantile function at q = 0, .25, .5, .75 and 1, shape (rows, 5).
+
+    The tails mirror the neighbouring quarter (the 0th percentile lies as far
+    below p25 as the median lies above it), clipped at zero.
+    """
+    p25, median, p75 = percentiles.T
+    return np.stack([np.maximum(p25 - (median - p25), 0.0), p25, median, p75, p75 + (p75 - median)], axis=1)
+
+
+def _row_points(knots: np.ndarray) -> np.ndarray:
+    """Values of each row's points, shape (rows, len(_ROW_WEIGHTS))."""
+    segment = np.minimum((_ROW_CENTRES * 4).astype(int), 3)
+    t = _ROW_CENTRES * 4 - segment
+    return knots[:, segment] * (1 - t) + knots[:, segment + 1] * t
+
+
+def exact_quantiles(knots: np.ndarray, codes: np.ndarray, n_groups, qs) -> np.ndarray:
+    """
+    Exact quantiles of each group's equal-weight mixture of row quantile functions.
+
+    Each row spreads a quarter of its mass uniformly over every segment between
+    its knots (a zero-width segment is a point mass). Sorting the segment ends
+    per group and summing slopes and jumps gives the mixture CDF at every
+    breakpoint, which is inverted by interpolation.
+
+    Args:
+        knots: Knots of each row (see _row_knots)
+        codes: Group of each row (0 .. n_groups - 1; every group has rows)
+        n_groups: Number of groups
+        qs: Quantiles to return
+
+    Returns:
+        np.ndarray: shape (n_groups, len(qs))
+    """
+    sizes = np.bincount(codes, minlength=n_groups)
+    lo, hi = knots[:, :-1].ravel(), knots[:, 1:].ravel()
+    seg_codes = np.repeat(codes, 4)
+    mass = 0.25 / sizes[seg_codes]
+    width = hi - lo
+    ramp = width > 0
+    slope = np.where(ramp, mass / np.where(ramp, width, 1.0), 0.0)
+
+    # Events: a ramp starts (+slope) and ends (-slope); a point mass jumps
+    x = np.r_[lo, hi, lo]
+    group = np.r_[seg_codes, seg_codes, seg_codes]
+    dslope = np.r_[slope, -slope, np.zeros_like(slope)]
+    jump = np.r_[np.zeros_like(mass), np.zeros_like(mass), np.where(ramp, 0.0, mass)]
+    order = np.lexsort((x, group))
+    x, group, dslope, jump = x[order], group[order], dslope[order], jump[order]
+
+    first = np.r_[True, group[1:] != group[:-1]]
+    dx = np.where(first, 0.0, np.diff(x, prepend=x[0]))
+    slope_before = np.cumsum(dslope) - dslope
+    # Cumulative sums restart at every group
+    starts = np.flatnonzero(first)
+    slope_before -= np.repeat(slope_before[starts], np.diff(np.r_[starts, len(x)]))
+    area = np.cumsum(slope_before * dx)
+    jumps = np.cumsum(jump)
+    base = np.repeat(area[starts] + jumps[starts] - jump[starts], np.diff(np.r_[starts, len(x)]))
+    before = area + jumps - jump - base
+    after = before + jump
+
+    # CDF just before and after each event, groups laid out 2 apart on one axis
+    cdf = np.maximum.accumulate(np.c_[before, after].ravel() + np.repeat(group * 2.0, 2))
+    values = np.repeat(x, 2)
+    targets = np.arange(n_groups)[:, None] * 2.0 + np.asarray(qs, dtype=float)[None, :]
+    return np.interp(targets, cdf, values)
+
+
+class QuantileSketches:
+    """
+    A batch of t-digest style sketches stored back to back.
+
+    Sketch i owns centroids offsets[i]:offsets[i + 1] (sorted by mean) plus the
+    exact minimum and maximum of the values it summarises. Sketches merge by
+    pooling their centroids, so any rollup is built from the finer sketches.
+    """
+
+    def __init__(self, offsets, means, weights, mins, maxs):
+        self.offsets = offsets
+        self.means = means
+        self.weights = weights
+        self.mins = mins
+        self.maxs = maxs
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @classmethod
+    def from_points(cls, codes, values, weights, n_groups, mins=None, maxs=None, delta=DELTA):
+        """
+        Compress weighted points into one sketch per group code.
+
+        Points are sorted by value within their group and binned on the t-digest
+        k1 scale, k(q) = delta / (2 pi) * asin(2q - 1), by the cumulative weight
+        at their centre; each bin becomes one centroid.
+
+        Args:
+            codes: Group of each point (0 .. n_groups - 1; every group has points)
+            values: Point values
+            weights: Point weights
+            n_groups: Number of sketches
+            mins, maxs: Exact extremes per group (default: of the points)
+            delta: Compression
+
+        Returns:
+            QuantileSketches
+        """
+        order = np.lexsort((values, codes))
+        codes, values, weights = codes[order], values[order], weights[order]
+
+        totals = np.bincount(codes, weights, n_groups)
+        cumulative = np.cumsum(weights)
+        starts = np.searchsorted(codes, np.arange(n_groups))
+        before = np.r_[0.0, cumulative][starts][codes]
+        q = (cumulative - before - weights / 2) / totals[codes]
+        bins = np.floor(delta / (2 * np.pi) * np.arcsin(np.clip(2 * q - 1, -1, 1)))
+
+        new = np.r_[True, (codes[1:] != codes[:-1]) | (bins[1:] != bins[:-1])]
+        ids = np.cumsum(new) - 1
+        merged_weights = np.bincount(ids, weights)
+        merged_means = np.bincount(ids, weights * values) / merged_weights
+        merged_codes = codes[new]
+
+        if mins is None:
+            mins = np.minimum.reduceat(values, starts)
+            maxs = np.maximum.reduceat(values, starts)
+        offsets = np.searchsorted(merged_codes, np.arange(n_groups + 1))
+        return cls(offsets, merged_means, merged_weights, mins, maxs)
+
+    def merge(self, codes, n_groups):
+        """
+        Merge sketches into coarser ones.
+
+        Args:
+            codes: Target group of each sketch (-1 drops it)
+            n_groups: Number of merged sketches
+
+        Returns:
+            QuantileSketches
+        """
+        keep = codes >= 0
+        sizes = np.diff(self.offsets)
+        point_codes = np.repeat(codes, sizes)
+        point_keep = np.repeat(keep, sizes)
+        mins = np.full(n_groups, np.inf)
+        maxs = np.full(n_groups, -np.inf)
+        np.minimum.at(mins, codes[keep], self.mins[keep])
+        np.maximum.at(maxs, codes[keep], self.maxs[keep])
+        return QuantileSketches.from_points(
+            point_codes[point_keep], self.means[point_keep], self.weights[point_keep], n_groups, mins, maxs)
+
+    def quantiles(self, qs) -> np.ndarray:
+        """
+        Estimated quantiles of every sketch, shape (sketches, len(qs)).
+
+        Interpolates linearly between centroid centres (cumulative weight at the
+        middle of each centroid), anchored at the sketch's minimum for q = 0 and
+        maximum for q = 1.
+        """
+        n = len(self)
+        if n == 0:
+            return np.empty((0, len(qs)))
+        sizes = np.diff(self.offsets)
+        codes = np.repeat(np.arange(n), sizes)
+        cumulative = np.cumsum(self.weights)
+        before = np.r_[0.0, cumulative][self.offsets[:-1]][codes]
+        totals = np.bincount(codes, self.weights, n)
+        centres = (cumulative - before - self.weights / 2) / totals[codes]
+
+        # Groups are laid out 2 apart on one axis, so a single interp covers all
+        groups = np.arange(n) * 2.0
+        x = np.r_[groups, codes * 2.0 + centres, groups + 1]
+        y = np.r_[self.mins, self.means, self.maxs]
+        order = np.argsort(x, kind="mergesort")
+        targets = groups[:, None] + np.asarray(qs, dtype=float)[None, :]
+        return np.interp(targets, x[order], y[order])
+
+
+def _group_rows(rows: np.ndarray, offsets: np.ndarray, groups: np.ndarray):
+    """
+    Rows of the given groups from a group -> rows index.
+
+    Args:
+        rows: Row numbers sorted by group
+        offsets: Group i owns rows[offsets[i]:offsets[i + 1]]
+        groups: Groups to read
+
+    Returns:
+        (row numbers, position in groups of each row's group)
+    """
+    sizes = offsets[groups + 1] - offsets[groups]
+    which = np.repeat(np.arange(len(groups)), sizes)
+    starts = np.cumsum(sizes) - sizes
+    return rows[offsets[groups][which] + np.arange(len(which)) - starts[which]], which
+
+
+def _spread_frame(keys: pd.DataFrame, sketches: QuantileSketches, counts: np.ndarray,
+                  knots: np.ndarray, cell_rows, cell_groups=None) -> pd.DataFrame:
+    """
+    Quartiles, IQR and IQR ratio of each sketch next to its keys.
+
+    Groups of at most EXACT_ROWS rows take the exact quartiles of their rows
+    instead, read from cell_rows (rows, offsets of a group -> rows index over
+    cells); cell_groups maps each cell to its group (-1 for none) when the
+    groups are merged from several cells.
+    """
+    quartiles = sketches.quantiles(QUARTILES)
+    small = np.flatnonzero((counts > 0) & (counts <= EXACT_ROWS))
+    if len(small):
+        if cell_groups is None:
+            cells, positions = small, np.arange(len(small))
+        else:
+            small_codes = np.full(len(counts), -1, dtype=np.intp)
+            small_codes[small] = np.arange(len(small))
+            positions = np.where(cell_groups >= 0, small_codes[cell_groups], -1)
+            cells = np.flatnonzero(positions >= 0)
+            positions = positions[cells]
+        rows, which = _group_rows(*cell_rows, cells)
+        quartiles[small] = exact_quantiles(knots[rows], positions[which], len(small), QUARTILES)
+
+    frame = keys.reset_index(drop=True).copy()
+    for j, col in enumerate(PERCENTILE_COLS):
+        frame[col] = quartiles[:, j]
+    frame["IQR"] = frame["gross_mthly_75_percentile"] - frame["gross_mthly_25_percentile"]
+    frame["IQR_ratio"] = frame["IQR"] / frame["gross_monthly_median"]
+    frame["count"] = counts.astype(np.int64)
+    return frame
+
+
+def _build_spread_sketches(df: pd.DataFrame) -> dict:
+    """
+    Sketches of the salary distribution at every grouping level.
+
+    Returns:
+        dict: tuple of dimensions (in DIMENSIONS order) -> (keys, sketches,
+        counts, knots, group_rows, spread) where counts is the number of survey
+        rows per group, knots the rows' quantile knots (shared by all levels),
+        group_rows (rows, offsets) the rows of each group and spread the
+        precomputed output of salary_spread for that level. Base sketches are
+        compressed from the rows' points, with a missing dimension value as a
+        key of its own; every level is merged from them, so a row is only left
+        out of the levels that include its missing dimension.
+    """
+    percentiles = exact_metrics(df[PERCENTILE_COLS]).to_numpy(dtype=float)
+    valid = ~np.isnan(percentiles).any(axis=1)
+    keys, percentiles = df.loc[valid, DIMENSIONS], percentiles[valid]
+
+    codes, base_keys = group_keys(keys, DIMENSIONS, dropna=False)
+    knots = _row_knots(percentiles)
+    points = _row_points(knots)
+    n_points = points.shape[1]
+    # Survey rows carry no respondent counts, so every row weighs the same
+    base = QuantileSketches.from_points(
+        np.repeat(codes, n_points), points.ravel(), np.tile(_ROW_WEIGHTS, len(codes)), len(base_keys))
+    base_counts = np.bincount(codes, minlength=len(base_keys))
+
+    cube = {}
+    for size in range(len(DIMENSIONS), -1, -1):
+        for level in combinations(DIMENSIONS, size):
+            level_codes, level_keys = group_keys(base_keys, list(level))
+            if size == len(DIMENSIONS) and (level_codes >= 0).all():
+                # No missing keys: the base sketches are this level as they are
+                sketches, counts = base, base_counts
+            else:
+                sketches = base.merge(level_codes, len(level_keys))
+                counts = np.bincount(level_codes[level_codes >= 0], base_counts[level_codes >= 0], len(level_keys))
+            row_codes = level_codes[codes]
+            rows = np.flatnonzero(row_codes >= 0)
+            rows = rows[np.argsort(row_codes[rows], kind="stable")]
+            offsets = np.r_[0, np.cumsum(np.bincount(row_codes[rows], minlength=len(level_keys)))]
+            spread = _spread_frame(level_keys, sketches, counts, knots, (rows, offsets))
+            cube[level] = (level_keys, sketches, counts, knots, (rows, offsets), spread)
+    return cube
+
+
+def get_spread_sketches(file_path) -> dict:
+    """Salary quantile sketches of a dataset, cached per dataset version."""
+    return get_derived(file_path, "spread_sketches", _build_spread_sketches)
+
+
+@timed("aggregate")
+def salary_spread(file_path, group_by=(), filters=None) -> pd.DataFrame:
+    """
+    Salary quartiles, IQR and IQR ratio for any rollup of the cleaned data.
+
+    Reads the sketch level covering exactly the filtered and grouped
+    dimensions; filters with several values on a dimension that is not
+    grouped on merge the matching sketches.
+
+    Args:
+        file_path: Path to the cleaned CSV file
+        group_by: Dimensions to group by (subset of DIMENSIONS, output in this order)
+        filters: Mapping of dimension -> value or list of values (optional)
+
+    Returns:
+        DataFrame with the group_by columns, the three salary percentiles, IQR,
+        IQR_ratio and count (survey rows), sorted by the group_by columns
+
+    Raises:
+        ValueError: If a dimension is unknown or a year is not an integer
+    """
+    unknown = [d for d in list(group_by) + list(filters or {}) if d not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimension(s): {', '.join(map(str, unknown))}")
+    group_by = [d for d in DIMENSIONS if d in group_by]
+    filters = normalise_filters(filters)
+    columns = group_by + SPREAD_COLS + ["count"]
+
+    level = tuple(d for d in DIMENSIONS if d in group_by or d in filters)
+    keys, sketches, counts, knots, group_rows, spread = get_spread_sketches(file_path)[level]
+    if not filters:
+        return spread[columns]
+
+    # Sketches are unique per level, so merging is only needed when a dimension
+    # that is not grouped on was filtered to several values
+    mask = cell_mask(keys, filters)
+    if not mask.any() or not any(len(wanted) > 1 for dim, wanted in filters.items() if dim not in group_by):
+        return spread[mask][columns].reset_index(drop=True)
+
+    codes = np.full(len(keys), -1, dtype=np.intp)
+    codes[mask], merged_keys = group_keys(keys[mask], group_by)
+    merged = sketches.merge(codes, len(merged_keys))
+    merged_counts = np.bincount(codes[mask], counts[mask], len(merged_keys))
+    return _spread_frame(merged_keys[group_by], merged, merged_counts, knots, group_rows, codes)
+
+
+# Script to check the sketch quartiles against the exact ones at every level
+if __name__ == "__main__":
+    worst = 0.0
+    for level, (keys, sketches, counts, knots, (rows, offsets), spread) in get_spread_sketches(CLEANED_CSV).items():
+        exact = exact_quantiles(knots[rows], np.repeat(np.arange(len(keys)), np.diff(offsets)), len(keys), QUARTILES)
+        error = float(np.max(np.abs(spread[PERCENTILE_COLS].to_numpy() - exact) / exact))
+        worst = max(worst, error)
+        print(f"{', '.join(level) or '(all)'}: {len(keys)} groups, max relative error {error:.4%}")
+    print(f"Worst {worst:.4%} (limit {MAX_RELATIVE_ERROR:.2%})")
+    sys.exit(worst > MAX_RELATIVE_ERROR)
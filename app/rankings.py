@@ -1,5 +1,9 @@
 import pandas as pd
 import numpy as np
+from dataset_store import get_derived, exact_metrics
+from instrumentation import timed
+from rollup import rollup
+from sql_backend import sql_table, aggregate, distinct_values
 
 REQUIRED_COLS = {"year", "degree", "gross_monthly_median"}
 
@@ -9,60 +13,21 @@ def _validate_columns(df: pd.DataFrame) -> None:
         raise ValueError(f"Missing required columns: {sorted(missing)}")
 
 def _clean_numeric(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    out["year"] = pd.to_numeric(out["year"], errors="coerce").astype("Int64")
-    out["gross_monthly_median"] = pd.to_numeric(out["gross_monthly_median"], errors="coerce")
-    out = out.dropna(subset=["year", "degree", "gross_monthly_median"])
-    out["year"] = out["year"].astype(int)
-    return out
-
-def rankings(
-    csv_path: str,
-    year: int,
-    n: int = 10,
-    mode: str = "top",
-    group_by: str = "degree",
-    include_most_improved: bool = True,
-):
-    """
-    For a chosen year, compute:
-    - Top/Bottom N by gross_monthly_median
-    - Rank change from previous year (Δrank)
-    - % change in median salary vs previous year
-
-    Ranking rule:
-      rank 1 = highest salary (descending).
-      Δrank = prev_rank - curr_rank  (positive means improved, moved up)
-
-    group_by:
-      - "degree" (default)
-      - "degree_university" (if you want separate ranking per university)
-    """
-    df = pd.read_csv(csv_path)
-    _validate_columns(df)
-    df = _clean_numeric(df)
-
-    # Decide grouping keys
-    if group_by == "degree_university":
-        if "university" not in df.columns:
-            raise ValueError("group_by='degree_university' requires a 'university' column.")
-        keys = ["degree", "university"]
-    else:
-        keys = ["degree"]
-
-    # Aggregate to one row per group per year (mean is safest if duplicates exist)
-    agg = (
-        df.groupby(keys + ["year"], as_index=False)["gross_monthly_median"]
-          .mean()
-          .rename(columns={"gross_monthly_median": "median_salary"})
-    )
-
+    # Numeric coercion already happened in the dataset store; only drop gaps here
+    out = df.dropna(subset=["year", "degree", "gross_monthly_median"])
+    out = out.astype({"year": int})
+    return out.assign(gross_monthly_median=exact_metrics(out["gross_monthly_median"]))
+
+GROUP_KEYS = {
+    "degree": ["degree"],
+    "degree_university": ["degree", "university"],
+}
+
+def _rank_year(agg: pd.DataFrame, keys: list, year: int) -> pd.DataFrame:
+    """Rank one year's groups and attach previous-year rank and salary."""
     curr = agg[agg["year"] == int(year)].copy()
     prev = agg[agg["year"] == int(year) - 1].copy()
 
-    if curr.empty:
-        raise ValueError(f"No data found for year={year}")
-
     # Rank within the selected year
     curr["rank"] = curr["median_salary"].rank(method="min", ascending=False).astype(int)
 
@@ -91,6 +56,131 @@ def rankings(
         (merged["median_salary"] - merged["prev_median_salary"]) / merged["prev_median_salary"] * 100.0,
         np.nan,
     )
+    return merged
+
+# Pretty formatting for UI
+def _to_records(df0: pd.DataFrame):
+    if df0 is None or df0.empty:
+        return []
+    out = df0.copy()
+    out["median_salary"] = out["median_salary"].round(2)
+    out["prev_median_salary"] = out["prev_median_salary"].round(2)
+    out["pct_change_salary"] = out["pct_change_salary"].round(2)
+    # Ensure JSON-serializable NaNs become None in Jinja
+    return out.replace({np.nan: None}).to_dict(orient="records")
+
+def _ranked_orders(agg: pd.DataFrame, keys: list, year: int) -> dict:
+    """One year's formatted rows, presorted for each ranking mode."""
+    merged = _rank_year(agg, keys, year)
+    improved = merged.dropna(subset=["delta_rank"])
+    return {
+        "top": _to_records(merged.sort_values(["median_salary", "rank"], ascending=[False, True])),
+        "bottom": _to_records(merged.sort_values(["median_salary", "rank"], ascending=[True, True])),
+        "most_improved": _to_records(
+            improved.sort_values(["delta_rank", "median_salary"], ascending=[False, False])
+        ),
+    }
+
+def _build_rankings_cube(df: pd.DataFrame, csv_path: str) -> dict:
+    """
+    Rank every year for both grouping modes in one go.
+
+    Returns a dict with the available years and, per group_by and year, the
+    formatted rows presorted for "top", "bottom" and "most_improved" so a
+    query only has to take the first n.
+    """
+    _validate_columns(df)
+    df = _clean_numeric(df)
+    years = sorted(df["year"].unique().tolist())
+
+    groups = {}
+    for group_by, keys in GROUP_KEYS.items():
+        if not set(keys) <= set(df.columns):
+            continue
+
+        # One row per group per year (mean is safest if duplicates exist), merged from the rollup cube
+        agg = (
+            rollup(csv_path, keys + ["year"], metrics=["gross_monthly_median"], stats=("mean",))
+              .rename(columns={"gross_monthly_median_mean": "median_salary"})
+              .dropna(subset=["median_salary"])
+              .astype({"year": int})
+        )
+
+        groups[group_by] = {year: _ranked_orders(agg, keys, year) for year in years}
+
+    return {"years": years, "groups": groups}
+
+def get_rankings_cube(csv_path: str) -> dict:
+    """Rankings for every year and grouping, cached per dataset version."""
+    return get_derived(csv_path, "rankings_cube", lambda df: _build_rankings_cube(df, csv_path))
+
+def _sql_years(table: str) -> list:
+    years = distinct_values(table, "year", not_null=["degree", "gross_monthly_median"])
+    return [int(y) for y in years]
+
+def _sql_ranked(table: str, keys: list, year: int, years: list):
+    """Rank one year in the database: only the chosen and the previous year are read."""
+    if int(year) not in years:
+        return None
+    agg = (
+        aggregate(table, keys + ["year"], ["gross_monthly_median"], {"year": [int(year), int(year) - 1]})
+          .rename(columns={"gross_monthly_median_mean": "median_salary"})
+          .dropna(subset=["median_salary"])
+          .astype({"year": int})
+    )
+    return _ranked_orders(agg, keys, year)
+
+def available_years(csv_path: str) -> list:
+    """Years that can be ranked, ascending."""
+    table = sql_table(csv_path)
+    if table:
+        return _sql_years(table)
+    return list(get_rankings_cube(csv_path)["years"])
+
+@timed('filter')
+def rankings(
+    csv_path: str,
+    year: int,
+    n: int = 10,
+    mode: str = "top",
+    group_by: str = "degree",
+    include_most_improved: bool = True,
+):
+    """
+    For a chosen year, compute:
+    - Top/Bottom N by gross_monthly_median
+    - Rank change from previous year (Δrank)
+    - % change in median salary vs previous year
+
+    Ranking rule:
+      rank 1 = highest salary (descending).
+      Δrank = prev_rank - curr_rank  (positive means improved, moved up)
+
+    group_by:
+      - "degree" (default)
+      - "degree_university" (if you want separate ranking per university)
+
+    Every year is ranked once per dataset version (see get_rankings_cube);
+    this only picks the slice and takes the first n rows. With the SQL
+    backend the chosen year is aggregated and ranked in the database instead.
+    """
+    # Decide grouping keys
+    cube_key = "degree_university" if group_by == "degree_university" else "degree"
+
+    table = sql_table(csv_path)
+    if table:
+        # SQL backend: aggregate and rank just this year (and the one before)
+        years = _sql_years(table)
+        ranked = _sql_ranked(table, GROUP_KEYS[cube_key], year, years)
+    else:
+        cube = get_rankings_cube(csv_path)
+        if cube_key not in cube["groups"]:
+            raise ValueError("group_by='degree_university' requires a 'university' column.")
+        years = cube["years"]
+        ranked = cube["groups"][cube_key].get(int(year))
+
+    if ranked is None:
+        raise ValueError(f"No data found for year={year}")
 
     # Select Top/Bottom order
     mode = (mode or "top").lower().strip()
@@ -98,34 +188,14 @@ def rankings(
     n = max(1, min(n, 50))  # prevent crazy table sizes
 
     if mode == "bottom":
-        selected = merged.sort_values(["median_salary", "rank"], ascending=[True, True]).head(n)
+        selected = ranked["bottom"][:n]
         label = f"Bottom {n}"
     else:
-        selected = merged.sort_values(["median_salary", "rank"], ascending=[False, True]).head(n)
+        selected = ranked["top"][:n]
         label = f"Top {n}"
 
     # Most improved (biggest positive Δrank)
-    most_improved = pd.DataFrame()
-    if include_most_improved and merged["delta_rank"].notna().any():
-        most_improved = (
-            merged.dropna(subset=["delta_rank"])
-                  .sort_values(["delta_rank", "median_salary"], ascending=[False, False])
-                  .head(n)
-        )
-
-    # Pretty formatting for UI
-    def to_records(df0: pd.DataFrame):
-        if df0 is None or df0.empty:
-            return []
-        out = df0.copy()
-        out["median_salary"] = out["median_salary"].round(2)
-        out["prev_median_salary"] = out["prev_median_salary"].round(2)
-        out["pct_change_salary"] = out["pct_change_salary"].round(2)
-        # Ensure JSON-serializable NaNs become None in Jinja
-        return out.replace({np.nan: None}).to_dict(orient="records")
-
-    # Also return available years for dropdown
-    years = sorted(df["year"].unique().tolist())
+    most_improved = ranked["most_improved"][:n] if include_most_improved else []
 
     return {
         "year": int(year),
@@ -133,7 +203,7 @@ def rankings(
         "mode": mode,
         "label": label,
         "group_by": group_by,
-        "years": years,
-        "rows": to_records(selected),
-        "most_improved": to_records(most_improved),
+        "years": list(years),
+        "rows": selected,
+        "most_improved": most_improved,
     }
@@ -1,40 +1,29 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
-
-NUMERIC_COLS = [
-    "employment_rate_overall",
-    "employment_rate_ft_perm",
-    "basic_monthly_mean",
-    "basic_monthly_median",
-    "gross_monthly_mean",
-    "gross_monthly_median",
-    "gross_mthly_25_percentile",
-    "gross_mthly_75_percentile",
-]
+from dataset_store import NUMERIC_COLS, CLEANED_CSV, DATA_DIR, get_dataset, get_derived, write_columnar, equals_mask, exact_metrics
+from instrumentation import span, timed
 
 
 def load_cleaned_data(csv_path: str) -> pd.DataFrame:
-    df = pd.read_csv(csv_path)
-    for col in NUMERIC_COLS:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors="coerce")
-    return df
+    # NUMERIC_COLS are coerced once by the dataset store
+    return get_dataset(csv_path)
 
 
 def _relationship_frame(df: pd.DataFrame, x_col: str, y_col: str) -> pd.DataFrame:
     base_cols = ["year", "university", "school", "degree", x_col, y_col]
     cols = [c for c in base_cols if c in df.columns]
-    rel = df[cols].dropna(subset=[x_col, y_col]).copy()
-    return rel
+    rel = df[cols].dropna(subset=[x_col, y_col])
+    return rel.assign(**exact_metrics(rel[[x_col, y_col]]))
 
 
 def _correlation_value(df: pd.DataFrame, x_col: str, y_col: str) -> float:
-    sub = df[[x_col, y_col]].dropna()
-    if len(sub) < 2:
-        return float("nan")
-    return float(sub[x_col].corr(sub[y_col]))
+    values = exact_metrics(df[[x_col, y_col]]).to_numpy(dtype=float)
+    _, r = _grouped_pearson(values[:, 0], values[:, 1], np.zeros(len(values), dtype=np.intp), 1)
+    return float(r[0])
 
 
+@timed('aggregate')
 def employment_rate_vs_salary(
     df: pd.DataFrame,
     salary_col: str = "gross_monthly_median",
@@ -53,9 +42,201 @@ def ft_perm_vs_salary(
     return rel, corr
 
 
+def relationship_trend(df: pd.DataFrame, university=None, degree=None) -> pd.DataFrame:
+    """
+    Yearly average employment rate and median salary for one university/degree slice.
+
+    Args:
+        df: Cleaned dataset
+        university: University name (optional)
+        degree: Degree name (optional, only applied together with a university)
+
+    Returns:
+        DataFrame with year, employment_rate_overall and gross_monthly_median
+    """
+    with span("filter"):
+        if university and degree:
+            df = df[equals_mask(df, "university", university) & equals_mask(df, "degree", degree)]
+        elif university:
+            df = df[equals_mask(df, "university", university)]
+
+    with span("aggregate"):
+        metrics = ["employment_rate_overall", "gross_monthly_median"]
+        df = df[["year"]].join(exact_metrics(df[metrics]))
+        return (
+            df.groupby("year", as_index=False)
+            .agg({
+                "employment_rate_overall": "mean",
+                "gross_monthly_median": "median",
+            })
+            .sort_values("year")
+        )
+
+
+# Slices of the correlation cube: level name -> grouping columns
+CORRELATION_LEVELS = {
+    "all": [],
+    "university": ["university"],
+    "university_degree": ["university", "degree"],
+    "year": ["year"],
+}
+CORRELATION_PAIRS = [
+    (x, y) for i, x in enumerate(NUMERIC_COLS) for y in NUMERIC_COLS[i + 1:]
+]
+
+
+def _grouped_pearson(x, y, codes, n_groups):
+    """
+    Pearson r per group from sufficient statistics (n, Σx, Σy, Σx², Σy², Σxy).
+
+    Rows where x or y is missing (or the group code is negative) are skipped,
+    so every pair uses its own complete observations. Groups with fewer than
+    two observations or no variance get NaN.
+
+    Returns:
+        tuple: (n per group, r per group)
+    """
+    m = ~(np.isnan(x) | np.isnan(y)) & (codes >= 0)
+    c, x, y = codes[m], x[m], y[m]
+    if len(c):
+        # Centre on the overall mean: r is shift-invariant and the sums stay well conditioned
+        x, y = x - x.mean(), y - y.mean()
+
+    n = np.bincount(c, minlength=n_groups).astype(float)
+    sx = np.bincount(c, x, n_groups)
+    sy = np.bincount(c, y, n_groups)
+    sxx = np.bincount(c, x * x, n_groups)
+    syy = np.bincount(c, y * y, n_groups)
+    sxy = np.bincount(c, x * y, n_groups)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vx = sxx - sx * sx / n
+        vy = syy - sy * sy / n
+        r = (sxy - sx * sy / n) / np.sqrt(vx * vy)
+    # Variances that are only rounding error mean a constant column
+    degenerate = (n < 2) | (vx <= 1e-9 * sxx) | (vy <= 1e-9 * syy)
+    r = np.where(degenerate, np.nan, np.clip(r, -1.0, 1.0))
+    return n.astype(np.int64), r
+
+
+def _group_ranks(values, codes):
+    """Average ranks of each column within its group (NaN stays NaN)."""
+    return pd.DataFrame(values).groupby(codes).rank(method="average").to_numpy(dtype=float)
+
+
+def _correlation_level(values, codes, n_groups, complete):
+    """Pearson and Spearman for every column pair, as (n, pearson, spearman) arrays of shape (groups, pairs)."""
+    col = {c: i for i, c in enumerate(NUMERIC_COLS)}
+    shape = (n_groups, len(CORRELATION_PAIRS))
+    n, pearson, spearman = np.zeros(shape, dtype=np.int64), np.empty(shape), np.empty(shape)
+
+    # Spearman is Pearson on within-group ranks. Ranks are shared across pairs
+    # when no value is missing; otherwise each pair ranks its complete rows.
+    ranks = _group_ranks(values, codes) if complete else None
+    for k, (x_col, y_col) in enumerate(CORRELATION_PAIRS):
+        x, y = values[:, col[x_col]], values[:, col[y_col]]
+        n[:, k], pearson[:, k] = _grouped_pearson(x, y, codes, n_groups)
+        if ranks is not None:
+            rx, ry = ranks[:, col[x_col]], ranks[:, col[y_col]]
+        else:
+            both = ~(np.isnan(x) | np.isnan(y))
+            pair_ranks = _group_ranks(np.column_stack([x, y])[both], codes[both])
+            rx, ry = np.full(len(x), np.nan), np.full(len(y), np.nan)
+            rx[both], ry[both] = pair_ranks[:, 0], pair_ranks[:, 1]
+        _, spearman[:, k] = _grouped_pearson(rx, ry, codes, n_groups)
+    return n, pearson, spearman
+
+
+def _build_correlation_cube(df: pd.DataFrame) -> dict:
+    values = exact_metrics(df[NUMERIC_COLS]).to_numpy(dtype=float)
+    complete = not np.isnan(values).any()
+    x_cols = [x for x, _ in CORRELATION_PAIRS]
+    y_cols = [y for _, y in CORRELATION_PAIRS]
+
+    cube = {}
+    for level, keys in CORRELATION_LEVELS.items():
+        if keys:
+            grouped = df.groupby(keys, observed=True, sort=True)
+            codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.intp)  # -1: missing key
+            key_frame = grouped.size().reset_index()[keys]
+        else:
+            codes = np.zeros(len(df), dtype=np.intp)
+            key_frame = pd.DataFrame(index=[0])
+        n_groups = len(key_frame)
+        n, pearson, spearman = _correlation_level(values, codes, n_groups, complete)
+
+        # Long table, one block of CORRELATION_PAIRS rows per slice
+        table = key_frame.loc[key_frame.index.repeat(len(CORRELATION_PAIRS))].reset_index(drop=True)
+        table["x"] = x_cols * n_groups
+        table["y"] = y_cols * n_groups
+        table["n"] = n.ravel()
+        table["pearson"] = pearson.ravel()
+        table["spearman"] = spearman.ravel()
+
+        index = {(): 0} if not keys else {
+            tuple(int(v) if isinstance(v, np.integer) else v for v in key): g
+            for g, key in enumerate(key_frame.itertuples(index=False, name=None))
+        }
+        cube[level] = {"keys": keys, "table": table, "index": index}
+    return cube
+
+
+def get_correlation_cube(csv_path: str = CLEANED_CSV) -> dict:
+    """Correlation cube of every NUMERIC_COLS pair per slice level, cached per dataset version."""
+    return get_derived(csv_path, "correlation_cube", _build_correlation_cube)
+
+
+def correlation_level(university=None, degree=None, year=None) -> str:
+    """Cube level answering a slice: university(+degree) takes precedence over year."""
+    if university and degree:
+        return "university_degree"
+    if university:
+        return "university"
+    if year is not None:
+        return "year"
+    return "all"
+
+
+def correlations(csv_path: str = CLEANED_CSV, university=None, degree=None, year=None) -> pd.DataFrame:
+    """
+    Pearson and Spearman coefficients of every metric pair for one slice.
+
+    Args:
+        csv_path: Path to the cleaned CSV file
+        university: University name (optional)
+        degree: Degree name (optional, only used together with a university)
+        year: Year (optional, used when no university is given)
+
+    Returns:
+        DataFrame with x, y, n, pearson and spearman (empty if the slice has no rows)
+    """
+    level = correlation_level(university, degree, year)
+    entry = get_correlation_cube(csv_path)[level]
+    key = {"university_degree": (university, degree), "university": (university,),
+           "year": (int(year),) if year is not None else (), "all": ()}[level]
+    g = entry["index"].get(key)
+    columns = ["x", "y", "n", "pearson", "spearman"]
+    if g is None:
+        return pd.DataFrame(columns=columns)
+    size = len(CORRELATION_PAIRS)
+    return entry["table"].iloc[g * size:(g + 1) * size][columns].reset_index(drop=True)
+
+
+def correlation_table(csv_path: str = CLEANED_CSV, level: str = "university") -> pd.DataFrame:
+    """
+    Every slice of one cube level as a long table.
+
+    Raises:
+        ValueError: If the level is not one of CORRELATION_LEVELS
+    """
+    if level not in CORRELATION_LEVELS:
+        raise ValueError(f"Unknown correlation level: {level}")
+    return get_correlation_cube(csv_path)[level]["table"]
+
+
 def save_relationship_outputs(
-    csv_path: str = "../cleaned.csv",
-    output_dir: str = "..",
+    csv_path: str = CLEANED_CSV,
+    output_dir: str = DATA_DIR,
     salary_col: str = "gross_monthly_median",
 ) -> pd.DataFrame:
     df = load_cleaned_data(csv_path)
@@ -66,6 +247,8 @@ def save_relationship_outputs(
 
     rel1.to_csv(output_path / "employment_rate_vs_salary.csv", index=False)
     rel2.to_csv(output_path / "ft_perm_vs_salary.csv", index=False)
+    write_columnar(rel1, output_path / "employment_rate_vs_salary.csv")
+    write_columnar(rel2, output_path / "ft_perm_vs_salary.csv")
 
     summary = pd.DataFrame(
         [
@@ -86,6 +269,7 @@ def save_relationship_outputs(
         ]
     )
     summary.to_csv(output_path / "relationship_summary.csv", index=False)
+    write_columnar(summary, output_path / "relationship_summary.csv")
     return summary
 
 
@@ -0,0 +1,266 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, request
+
+from dataset_store import BASE_DIR, dataset_version
+
+# Configuration (environment variables, so every WSGI worker agrees)
+#   RESPONSE_CACHE             memory (default), filesystem or off
+#   RESPONSE_CACHE_TTL         seconds an entry stays valid
+#   RESPONSE_CACHE_MAX_ENTRIES maximum number of cached responses
+#   RESPONSE_CACHE_MAX_BYTES   maximum total body size (memory backend)
+#   RESPONSE_CACHE_DIR         directory of the filesystem backend
+CACHE_BACKEND = os.environ.get('RESPONSE_CACHE', 'memory').lower()
+CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 512))
+CACHE_MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+CACHE_DIR = os.environ.get('RESPONSE_CACHE_DIR', os.path.join(BASE_DIR, '.cache', 'responses'))
+
+# Headers that must be recomputed (or are per-request) rather than replayed
+_SKIP_HEADERS = {'content-length', 'set-cookie', 'x-cache'}
+
+
+class CachedResponse:
+    """Status, headers and body of a rendered response."""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class MemoryBackend:
+    """In-process LRU bounded by entry count, total body size and age."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        size = len(value.body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, value = self._entries.pop(key)
+        self._bytes -= len(value.body)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes, 'evictions': self.evictions}
+
+
+class FilesystemBackend:
+    """
+    Cache shared by every worker on a node: one file per entry.
+
+    Each file holds a JSON header line (expiry, status, headers) followed by
+    the raw body. Files are written to a temp name and renamed into place.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get('key') != key:
+            return None
+        if meta['expires'] < time.time():
+            self._unlink(path)
+            return None
+        return CachedResponse(meta['status'], [tuple(h) for h in meta['headers']], body)
+
+    def set(self, key, value):
+        path = self._path(key)
+        meta = {'key': key, 'expires': time.time() + self.ttl, 'status': value.status, 'headers': value.headers}
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(json.dumps(meta, separators=(',', ':')).encode() + b'\n')
+                f.write(value.body)
+            os.replace(tmp, path)
+        except OSError:
+            self._unlink(tmp)
+            return
+        self._prune()
+
+    def _prune(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if not n.endswith('.tmp')]
+        except OSError:
+            return
+        excess = len(names) - self.max_entries
+        if excess <= 0:
+            return
+        paths = [os.path.join(self.directory, n) for n in names]
+        paths.sort(key=lambda p: os.path.getmtime(p) if os.path.exists(p) else 0)
+        for path in paths[:excess]:
+            self._unlink(path)
+            self.evictions += 1
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            self._unlink(os.path.join(self.directory, name))
+
+    def stats(self):
+        try:
+            names = [n for n in os.listdir(self.directory) if not n.endswith('.tmp')]
+        except OSError:
+            names = []
+        size = sum(os.path.getsize(os.path.join(self.directory, n)) for n in names
+                   if os.path.exists(os.path.join(self.directory, n)))
+        return {'entries': len(names), 'bytes': size, 'evictions': self.evictions}
+
+
+class ResponseCache:
+    """Keyed response store in front of a backend, with hit/miss counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(endpoint, args, versions):
+        """
+        Cache key from the route, its normalised arguments and dataset versions.
+
+        Arguments are sorted and empty values dropped, so `?b=1&a=` and `?b=1`
+        share an entry. Dataset versions are content hashes: when a CSV is
+        regenerated every key changes and old entries simply age out.
+        """
+        pairs = sorted((k, v) for k, v in args.items(multi=True) if v != '')
+        return json.dumps([endpoint, pairs, list(versions)], separators=(',', ':'))
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+        with self._lock:
+            self.stores += 1
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stores': self.stores,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            }
+        stats.update(self.backend.stats())
+        return stats
+
+
+def _create_cache():
+    if CACHE_BACKEND == 'off':
+        return None
+    if CACHE_BACKEND == 'filesystem':
+        try:
+            return ResponseCache(FilesystemBackend())
+        except OSError:
+            pass  # unwritable directory: fall back to a per-process cache
+    return ResponseCache(MemoryBackend())
+
+
+response_cache = _create_cache()
+
+
+def cached_response(*source_files):
+    """
+    Cache a view's successful responses until any of its source datasets change.
+
+    Args:
+        *source_files: CSV paths the view reads; their versions are part of the key
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if response_cache is None:
+                return view(*args, **kwargs)
+
+            versions = [dataset_version(path) for path in source_files]
+            key = response_cache.make_key(request.endpoint, request.args, versions)
+            cached = response_cache.get(key)
+            if cached is not None:
+                response = current_app.response_class(cached.body, status=cached.status, headers=cached.headers)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough:
+                headers = [(k, v) for k, v in response.headers.items() if k.lower() not in _SKIP_HEADERS]
+                response_cache.set(key, CachedResponse(response.status_code, headers, response.get_data()))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,201 @@
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from dataset_store import NUMERIC_COLS, get_derived, equals_mask, exact_metrics
+from instrumentation import timed
+
+# Finest grain of the cube; every subset of these is materialised
+DIMENSIONS = ["university", "school", "degree", "year"]
+
+# Mergeable aggregates stored per cell (last axis of a level's value array)
+CELL_AGGREGATES = ("count", "sum", "sumsq", "min", "max")
+_COUNT, _SUM, _SUMSQ, _MIN, _MAX = range(len(CELL_AGGREGATES))
+
+# Statistics a query can ask for (all derived from the stored aggregates)
+ROLLUP_STATS = ("count", "sum", "mean", "var", "std", "min", "max")
+
+
+def group_keys(keys: pd.DataFrame, by: list, dropna=True):
+    """
+    Group codes of each row of `keys` and the distinct key rows, sorted.
+
+    With dropna, rows missing a value in `by` get code -1 (as a pandas groupby
+    leaves them out); otherwise a missing value is a key of its own.
+    """
+    if not by:
+        return np.zeros(len(keys), dtype=np.intp), pd.DataFrame(index=range(1))
+    grouped = keys.groupby(by, observed=True, sort=True, dropna=dropna)
+    codes = grouped.ngroup().fillna(-1).to_numpy(dtype=np.intp)  # -1: missing key
+    return codes, grouped.size().reset_index()[by]
+
+
+def _merge_cells(keys: pd.DataFrame, values: np.ndarray, by: list, dropna=True):
+    """
+    Combine cells into coarser ones: counts and sums add up, min/max take the extreme.
+
+    Args:
+        keys: Dimension values of each cell
+        values: Array of shape (cells, metrics, CELL_AGGREGATES)
+        by: Dimensions of the merged cells
+        dropna: Leave out cells missing a value in `by` (else they form their own cells)
+
+    Returns:
+        tuple: (keys, values) of the merged cells
+    """
+    codes, merged_keys = group_keys(keys, by, dropna)
+    keep = codes >= 0
+    codes, values = codes[keep], values[keep]
+    n_groups, n_metrics = len(merged_keys), values.shape[1]
+
+    merged = np.empty((n_groups, n_metrics, len(CELL_AGGREGATES)))
+    for j in range(n_metrics):
+        for a in (_COUNT, _SUM, _SUMSQ):
+            merged[:, j, a] = np.bincount(codes, values[:, j, a], n_groups)
+    # fmin/fmax skip NaN (cells without values); groups that stay at ±inf have none
+    merged[:, :, _MIN], merged[:, :, _MAX] = np.inf, -np.inf
+    np.fmin.at(merged[:, :, _MIN], codes, values[:, :, _MIN])
+    np.fmax.at(merged[:, :, _MAX], codes, values[:, :, _MAX])
+    merged[:, :, _MIN:][np.isinf(merged[:, :, _MIN:])] = np.nan
+    return merged_keys, merged
+
+
+def _build_rollup_cube(df: pd.DataFrame) -> dict:
+    """
+    Materialise the cube at every grouping level.
+
+    Returns:
+        dict: tuple of dimensions (in DIMENSIONS order) -> (keys, values) where
+        keys holds the dimension values of each cell and values has shape
+        (cells, NUMERIC_COLS, CELL_AGGREGATES). Every level is merged from
+        base cells built from the rows, so a row missing a dimension value is
+        only left out of the levels that include that dimension.
+    """
+    x = exact_metrics(df[NUMERIC_COLS]).to_numpy(dtype=float)
+    present = ~np.isnan(x)
+    rows = np.stack([present.astype(float), np.where(present, x, 0.0), np.where(present, x * x, 0.0), x, x], axis=2)
+
+    base = _merge_cells(df[DIMENSIONS], rows, DIMENSIONS, dropna=False)
+    cube = {}
+    for size in range(len(DIMENSIONS), -1, -1):
+        for keys in combinations(DIMENSIONS, size):
+            cube[keys] = _merge_cells(base[0], base[1], list(keys))
+    return cube
+
+
+def get_rollup_cube(file_path) -> dict:
+    """Rollup cube of a dataset, cached per dataset version."""
+    return get_derived(file_path, "rollup_cube", _build_rollup_cube)
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+def normalise_filters(filters) -> dict:
+    """Filters as dimension -> list of values, dropping empty ones."""
+    return {k: _as_list(v) for k, v in (filters or {}).items() if v not in (None, "", [])}
+
+
+def cell_mask(keys: pd.DataFrame, filters: dict) -> np.ndarray:
+    """
+    Boolean mask of the cells matching every filter (any of its values).
+
+    Raises:
+        ValueError: If a year filter value is not an integer
+    """
+    mask = np.ones(len(keys), dtype=bool)
+    for dim, wanted in filters.items():
+        if dim == "year":
+            try:
+                wanted = [int(v) for v in wanted]
+            except (TypeError, ValueError):
+                raise ValueError("year filter values must be integers")
+        matches = np.zeros(len(keys), dtype=bool)
+        for value in wanted:
+            matches |= equals_mask(keys, dim, value)
+        mask &= matches
+    return mask
+
+
+def _finish(values: np.ndarray, metrics: list, stats: list) -> dict:
+    """Requested statistics per metric from merged cell aggregates."""
+    index = {m: i for i, m in enumerate(NUMERIC_COLS)}
+    out = {}
+    for m in metrics:
+        cell = values[:, index[m]]
+        n, total, sumsq = cell[:, _COUNT], cell[:, _SUM], cell[:, _SUMSQ]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = np.where(n > 0, total / n, np.nan)
+            var = np.where(n > 1, np.maximum(sumsq - total * mean, 0.0) / (n - 1), np.nan)
+        derived = {
+            "count": n.astype(np.int64),
+            "sum": total,
+            "mean": mean,
+            "var": var,
+            "std": np.sqrt(var),
+            "min": cell[:, _MIN],
+            "max": cell[:, _MAX],
+        }
+        for s in stats:
+            out[f"{m}_{s}"] = derived[s]
+    return out
+
+
+@timed("aggregate")
+def rollup(file_path, group_by=(), filters=None, metrics=None, stats=("mean",)) -> pd.DataFrame:
+    """
+    Answer a "filter these dimensions, group by those" query from the rollup cube.
+
+    The query reads the precomputed level covering exactly the filtered and
+    grouped dimensions, so it works on cells rather than rows. Filters with
+    several values merge the matching cells.
+
+    Args:
+        file_path: Path to the cleaned CSV file
+        group_by: Dimensions to group by (subset of DIMENSIONS, output in this order)
+        filters: Mapping of dimension -> value or list of values (optional)
+        metrics: Metric columns to return (default: all NUMERIC_COLS)
+        stats: Statistics per metric, from ROLLUP_STATS
+
+    Returns:
+        DataFrame with the group_by columns, then one `{metric}_{stat}` column
+        per requested metric and statistic, sorted by the group_by columns
+
+    Raises:
+        ValueError: If a dimension, metric or statistic is unknown
+    """
+    group_by = list(group_by)
+    filters = normalise_filters(filters)
+    metrics = list(metrics) if metrics else list(NUMERIC_COLS)
+    stats = list(stats)
+
+    unknown_dims = [d for d in group_by + list(filters) if d not in DIMENSIONS]
+    if unknown_dims:
+        raise ValueError(f"Unknown dimension(s): {', '.join(map(str, unknown_dims))}")
+    unknown_metrics = [m for m in metrics if m not in NUMERIC_COLS]
+    if unknown_metrics:
+        raise ValueError(f"Unknown metric(s): {', '.join(unknown_metrics)}")
+    unknown_stats = [s for s in stats if s not in ROLLUP_STATS]
+    if unknown_stats:
+        raise ValueError(f"Unknown statistic(s): {', '.join(unknown_stats)}")
+
+    level = tuple(d for d in DIMENSIONS if d in group_by or d in filters)
+    keys, values = get_rollup_cube(file_path)[level]
+
+    if filters:
+        mask = cell_mask(keys, filters)
+        keys, values = keys[mask], values[mask]
+
+    # Cells are unique per level, so merging is only needed when a dimension
+    # that is not grouped on was filtered to several values
+    if len(keys) and any(len(wanted) > 1 for dim, wanted in filters.items() if dim not in group_by):
+        keys, values = _merge_cells(keys, values, group_by)
+
+    result = pd.concat([
+        keys[group_by].reset_index(drop=True),
+        pd.DataFrame(_finish(values, metrics, stats), index=range(len(values))),
+    ], axis=1)
+    if group_by:
+        result = result.sort_values(group_by, kind="mergesort").reset_index(drop=True)
+    return result
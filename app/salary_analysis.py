@@ -1,4 +1,155 @@
+import numpy as np
 import pandas as pd
+from dataset_store import CLEANED_CSV, GROUPED_CSV, get_dataset, get_derived, write_columnar, equals_mask, exact_metrics
+from data_helpers import get_grouped_index
+from instrumentation import timed
+from quantile_sketch import salary_spread
+from sql_backend import sql_table, select_frame, select_rows, count_rows, distinct_values
+
+def _with_iqr_columns(data):
+    """Ensure IQR columns exist (older grouped files may lack them)."""
+    if 'IQR' in data.columns and 'IQR_ratio' in data.columns:
+        return data
+    data = data.copy()
+    if 'IQR' not in data.columns:
+        data['IQR'] = exact_metrics(data['gross_mthly_75_percentile'] - data['gross_mthly_25_percentile'])
+    if 'IQR_ratio' not in data.columns:
+        data['IQR_ratio'] = data['IQR'] / exact_metrics(data['gross_monthly_median'])
+    return data
+
+def load_grouped_data(file_path):
+    """Get the shared grouped salary dataset with IQR columns guaranteed."""
+    return get_derived(file_path, 'iqr_columns', _with_iqr_columns)
+
+SPREAD_METRICS = ('IQR', 'IQR_ratio')
+
+def get_spread_order(file_path, metric, descending=True):
+    """
+    Presorted row positions for a spread metric, cached per dataset version.
+
+    Args:
+        file_path: Path to the grouped salary analysis CSV file
+        metric: 'IQR' or 'IQR_ratio'
+        descending: Largest values first (NaN always last)
+
+    Returns:
+        numpy array of row positions into load_grouped_data(file_path)
+
+    Raises:
+        ValueError: If the metric is not a spread metric
+    """
+    if metric not in SPREAD_METRICS:
+        raise ValueError(f"Unknown spread metric: {metric}")
+
+    def build(df):
+        data = _with_iqr_columns(df)
+        orders = {}
+        for m in SPREAD_METRICS:
+            order = data[m].sort_values(ascending=not descending, kind='mergesort', na_position='last')
+            orders[m] = data.index.get_indexer(order.index)
+        return orders
+    return get_derived(file_path, f'spread_orders:{descending}', build)[metric]
+
+def _spread_positions(data, order, university=None, degree=None):
+    if not university and not degree:
+        return order
+    mask = np.ones(len(data), dtype=bool)
+    if university:
+        mask &= equals_mask(data, 'university', university)
+    if degree:
+        mask &= equals_mask(data, 'degree', degree)
+    return order[mask[order]]
+
+@timed('filter')
+def top_spread(file_path, metric='IQR', k=5, bottom=False, university=None, degree=None):
+    """
+    Top-K (or bottom-K) grouped rows by a spread metric, read off the presorted index.
+
+    Args:
+        file_path: Path to the grouped salary analysis CSV file
+        metric: 'IQR' or 'IQR_ratio'
+        k: Number of rows to return
+        bottom: Return the smallest values instead of the largest
+        university: Only rows for this university (optional)
+        degree: Only rows for this degree (optional)
+
+    Returns:
+        DataFrame with degree, university, year, the metric and the salary percentiles
+    """
+    columns = ['degree', 'university', 'year', metric,
+               'gross_mthly_25_percentile', 'gross_mthly_75_percentile', 'gross_monthly_median']
+    table = sql_table(file_path)
+    if table:
+        if metric not in SPREAD_METRICS:
+            raise ValueError(f"Unknown spread metric: {metric}")
+        filters = {'university': university or None, 'degree': degree or None}
+        return select_frame(table, columns, filters, sort=metric, descending=not bottom, limit=max(0, k))
+
+    data = load_grouped_data(file_path)
+    positions = _spread_positions(data, get_spread_order(file_path, metric, not bottom), university, degree)
+    return data.iloc[positions[:max(0, k)]][columns]
+
+@timed('filter')
+def page_spread(file_path, sort='IQR', descending=True, offset=0, limit=50, university=None, degree=None):
+    """
+    One page of the grouped salary data sorted by a spread metric.
+
+    Args:
+        file_path: Path to the grouped salary analysis CSV file
+        sort: 'IQR' or 'IQR_ratio'
+        descending: Sort direction
+        offset: Index of the first row to return
+        limit: Maximum number of rows to return
+        university: Only rows for this university (optional)
+        degree: Only rows for this degree (optional)
+
+    Returns:
+        tuple: (page DataFrame, total matching rows)
+    """
+    table = sql_table(file_path)
+    if table:
+        if sort not in SPREAD_METRICS:
+            raise ValueError(f"Unknown spread metric: {sort}")
+        filters = {'university': university or None, 'degree': degree or None}
+        page = select_frame(table, filters=filters, sort=sort, descending=descending, limit=limit, offset=offset)
+        return page, count_rows(table, filters)
+
+    data = load_grouped_data(file_path)
+    positions = _spread_positions(data, get_spread_order(file_path, sort, descending), university, degree)
+    return data.iloc[positions[offset:offset + limit]], int(len(positions))
+
+def spread_rollup(file_path, group_by, university=None, degree=None, year=None):
+    """
+    Salary spread of any rollup, estimated from the mergeable quantile sketches.
+
+    Unlike the grouped file (min of 25th / max of 75th percentiles per
+    degree, university and year), the quartiles here are those of the pooled
+    salary distribution of every survey row in the group.
+
+    Args:
+        file_path: Path to the cleaned CSV file
+        group_by: Dimensions to group by (university, school, degree, year)
+        university: Only rows for this university (optional)
+        degree: Only rows for this degree (optional)
+        year: Only rows for this year (optional)
+
+    Returns:
+        DataFrame with the group_by columns, the salary percentiles, IQR,
+        IQR_ratio and count (survey rows)
+
+    Raises:
+        ValueError: If a dimension is unknown or the year is not an integer
+    """
+    filters = {'university': university, 'degree': degree, 'year': year}
+    data = salary_spread(file_path, group_by, filters)
+    money = ['gross_mthly_25_percentile', 'gross_monthly_median', 'gross_mthly_75_percentile', 'IQR']
+    return data.assign(**{c: data[c].round(2) for c in money}, IQR_ratio=data['IQR_ratio'].round(4))
+
+def sort_spread(data, metric='IQR', descending=True):
+    """Rows of a spread_rollup result sorted by a spread metric (NaN last)."""
+    if metric not in SPREAD_METRICS:
+        raise ValueError(f"Unknown spread metric: {metric}")
+    return data.sort_values(metric, ascending=not descending, kind='mergesort', na_position='last')
 
 def calculate_iqr_analysis(file_path):
     """
@@ -10,25 +161,49 @@ def calculate_iqr_analysis(file_path):
     Returns:
         tuple: (full_data, top_iqr, top_iqr_ratio)
     """
-    # Load the dataset
-    data = pd.read_csv(file_path)
+    # Shared dataset with IQR columns already present
+    data = load_grouped_data(file_path)
     
-    # Ensure IQR columns exist
-    if 'IQR' not in data.columns:
-        data['IQR'] = data['gross_mthly_75_percentile'] - data['gross_mthly_25_percentile']
-    if 'IQR_ratio' not in data.columns:
-        data['IQR_ratio'] = data['IQR'] / data['gross_monthly_median']
-    
-    # Get the top 5 entries based on IQR and IQR ratio
-    top_iqr = data.nlargest(5, 'IQR')[['degree', 'university', 'year', 'IQR', 
-                                        'gross_mthly_25_percentile', 'gross_mthly_75_percentile', 
-                                        'gross_monthly_median']]
-    top_iqr_ratio = data.nlargest(5, 'IQR_ratio')[['degree', 'university', 'year', 'IQR_ratio', 
-                                                     'gross_mthly_25_percentile', 'gross_mthly_75_percentile', 
-                                                     'gross_monthly_median']]
+    # Top 5 entries based on IQR and IQR ratio, straight from the presorted index
+    top_iqr = top_spread(file_path, 'IQR', 5)
+    top_iqr_ratio = top_spread(file_path, 'IQR_ratio', 5)
     
     return data, top_iqr, top_iqr_ratio
 
+LOOKUP_FIELDS = ['gross_mthly_25_percentile', 'gross_monthly_median', 'gross_mthly_75_percentile', 'IQR']
+
+def _build_salary_lookup(df):
+    """(degree, university, year) -> the numbers returned by get_filtered_salary_data."""
+    data = _with_iqr_columns(df)
+    columns = [data[c].tolist() for c in ['degree', 'university', 'year'] + LOOKUP_FIELDS + ['IQR_ratio']]
+
+    lookup = {}
+    for degree, university, year, p25, median, p75, iqr, ratio in zip(*columns):
+        key = (degree, university, int(year))
+        if key in lookup:
+            continue  # first row wins, as with the old mask-and-take-first lookup
+        values = [p25, median, p75, iqr]
+        if any(pd.isna(v) for v in values + [ratio]):
+            lookup[key] = None
+            continue
+        lookup[key] = dict(zip(LOOKUP_FIELDS, (int(v) for v in values)), IQR_ratio=float(ratio))
+    return lookup
+
+def _sql_salary_lookup(table, degree, university, year):
+    """One key of the salary lookup, read through the grouped table's key index."""
+    if degree is None or university is None:
+        return None
+    key = {'degree': degree, 'university': university, 'year': int(year)}
+    _, rows = select_rows(table, LOOKUP_FIELDS + ['IQR_ratio'], key, limit=1)
+    if not rows or any(v is None or pd.isna(v) for v in rows[0]):
+        return None
+    *values, ratio = rows[0]
+    return dict(zip(LOOKUP_FIELDS, (int(v) for v in values)), IQR_ratio=float(ratio))
+
+def get_salary_lookup(file_path):
+    """Get the hash index of the grouped salary data (rebuilt when the file changes)."""
+    return get_derived(file_path, 'salary_lookup', _build_salary_lookup)
+
 def get_filtered_salary_data(file_path, degree, university, year):
     """
     Get filtered salary data for specific degree, university, and year.
@@ -41,50 +216,105 @@ def get_filtered_salary_data(file_path, degree, university, year):
     
     Returns:
         dict: Filtered salary data or None if not found
-    """
-    data = pd.read_csv(file_path)
-    
-    # Ensure IQR columns exist
-    if 'IQR' not in data.columns:
-        data['IQR'] = data['gross_mthly_75_percentile'] - data['gross_mthly_25_percentile']
-    if 'IQR_ratio' not in data.columns:
-        data['IQR_ratio'] = data['IQR'] / data['gross_monthly_median']
     
-    filtered = data[(data['degree'] == degree) & 
-                    (data['university'] == university) & 
-                    (data['year'] == int(year))]
-    
-    if filtered.empty:
+    Raises:
+        ValueError: If year is not an integer
+    """
+    table = sql_table(file_path)
+    if table:
+        return _sql_salary_lookup(table, degree, university, year)
+    result = get_salary_lookup(file_path).get((degree, university, int(year)))
+    return dict(result) if result is not None else None
+
+def get_salary_rollup(file_path, degree=None, university=None, year=None):
+    """
+    Salary spread of all survey rows matching the given filters, pooled.
+
+    Answers /get_filtered_data when some of degree, university and year are
+    left out (e.g. a whole university across all years).
+
+    Args:
+        file_path: Path to the cleaned CSV file
+        degree: Degree name (optional)
+        university: University name (optional)
+        year: Year (optional)
+
+    Returns:
+        dict: The fields of get_filtered_salary_data plus count (survey rows),
+        or None if no rows match
+
+    Raises:
+        ValueError: If year is not an integer
+    """
+    data = salary_spread(file_path, (), {'degree': degree, 'university': university, 'year': year})
+    if data.empty or data[LOOKUP_FIELDS + ['IQR_ratio']].isna().any(axis=None):
         return None
-    
-    return {
-        'gross_mthly_25_percentile': int(filtered['gross_mthly_25_percentile'].values[0]),
-        'gross_monthly_median': int(filtered['gross_monthly_median'].values[0]),
-        'gross_mthly_75_percentile': int(filtered['gross_mthly_75_percentile'].values[0]),
-        'IQR': int(filtered['IQR'].values[0]),
-        'IQR_ratio': float(filtered['IQR_ratio'].values[0])
-    }
+    row = data.iloc[0]
+    return dict(zip(LOOKUP_FIELDS, (int(round(row[f])) for f in LOOKUP_FIELDS)),
+                IQR_ratio=float(row['IQR_ratio']), count=int(row['count']))
+
+def get_filtered_salary_batch(file_path, keys):
+    """
+    Look up many (degree, university, year) combinations at once.
+
+    Args:
+        file_path: Path to the grouped salary analysis CSV file
+        keys: Iterable of (degree, university, year) tuples
+
+    Returns:
+        list: One dict per key, or None where nothing was found
+
+    Raises:
+        ValueError: If a year is not an integer
+    """
+    table = sql_table(file_path)
+    if table:
+        return [_sql_salary_lookup(table, degree, university, year) for degree, university, year in keys]
+
+    lookup = get_salary_lookup(file_path)
+    results = []
+    for degree, university, year in keys:
+        result = lookup.get((degree, university, int(year)))
+        results.append(dict(result) if result is not None else None)
+    return results
 
 def get_degrees_for_university(file_path, university):
     """Get available degrees for a specific university."""
-    data = pd.read_csv(file_path)
-    degrees = data[data['university'] == university]['degree'].unique()
-    return degrees.tolist()
+    table = sql_table(file_path)
+    if table:
+        if university is None:
+            return []
+        return distinct_values(table, 'degree', {'university': university}, order='first')
+    index = get_grouped_index(file_path)
+    return list(index['degrees'].get(university, []))
 
 def get_years_for_university_degree(file_path, university, degree):
     """Get available years for a specific university and degree combination."""
-    data = pd.read_csv(file_path)
-    years = data[(data['university'] == university) & 
-                 (data['degree'] == degree)]['year'].unique()
-    return years.tolist()
+    table = sql_table(file_path)
+    if table:
+        if university is None or degree is None:
+            return []
+        years = distinct_values(table, 'year', {'university': university, 'degree': degree}, order='first')
+        return [int(y) for y in years]
+    index = get_grouped_index(file_path)
+    return list(index['years'].get((university, degree), []))
 
-# Script to generate the grouped salary analysis CSV (run once)
-if __name__ == '__main__':
-    # Load the dataset
-    data = pd.read_csv('../cleaned.csv')
+def build_grouped_salary_data(data):
+    """
+    Group the cleaned dataset by degree, university and year with IQR columns.
+
+    Args:
+        data: Cleaned dataset
+
+    Returns:
+        DataFrame in the layout of grouped_salary_analysis.csv
+    """
+    # Exact float64 percentiles, so the IQR maths matches the text values
+    percentile_cols = ['gross_mthly_25_percentile', 'gross_mthly_75_percentile', 'gross_monthly_median']
+    data = data[['degree', 'university', 'year']].join(exact_metrics(data[percentile_cols]))
 
     # Group by degree, university, and year
-    grouped_data = data.groupby(['degree', 'university', 'year']).agg({
+    grouped_data = data.groupby(['degree', 'university', 'year'], observed=True).agg({
         'gross_mthly_25_percentile': 'min',
         'gross_mthly_75_percentile': 'max',
         'gross_monthly_median': 'median'
@@ -93,7 +323,14 @@ if __name__ == '__main__':
     # Calculate IQR and IQR ratio
     grouped_data['IQR'] = grouped_data['gross_mthly_75_percentile'] - grouped_data['gross_mthly_25_percentile']
     grouped_data['IQR_ratio'] = grouped_data['IQR'] / grouped_data['gross_monthly_median']
+    return grouped_data
+
+# Script to generate the grouped salary analysis CSV (run once)
+if __name__ == '__main__':
+    # Load the dataset and group it
+    grouped_data = build_grouped_salary_data(get_dataset(CLEANED_CSV))
 
     # Save the result
-    grouped_data.to_csv('../grouped_salary_analysis.csv', index=False)
+    grouped_data.to_csv(GROUPED_CSV, index=False)
+    write_columnar(grouped_data, GROUPED_CSV)
     print("Salary spread analysis completed for each group!")
@@ -0,0 +1,318 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from contextlib import closing
+
+import numpy as np
+import pandas as pd
+from dataset_store import DATA_DIR, CLEANED_CSV, GROUPED_CSV, PROJECTIONS_CSV, file_digest
+from instrumentation import span
+
+# Configuration (environment variables, so every WSGI worker agrees)
+#   GES_BACKEND        memory (default): each worker parses the datasets into pandas
+#                      sqlite: lookups, filters and aggregations run as SQL against an
+#                      indexed SQLite file, so a query reads only the rows it needs
+#   GES_SQLITE_PATH    database file (rebuilt from the CSVs whenever one of them changes)
+#   GES_SQLITE_CHUNK   rows per chunk when loading a CSV into the database
+BACKEND = os.environ.get('GES_BACKEND', 'memory').lower()
+SQLITE_PATH = os.path.abspath(os.environ.get('GES_SQLITE_PATH', os.path.join(DATA_DIR, 'ges.sqlite')))
+BUILD_CHUNK_ROWS = int(os.environ.get('GES_SQLITE_CHUNK', 100_000))
+
+# table -> source CSV
+SQL_TABLES = {
+    'cleaned': CLEANED_CSV,
+    'grouped': GROUPED_CSV,
+    'projections': PROJECTIONS_CSV,
+}
+
+# table -> (index name, columns); columns missing from a file are left out
+SQL_INDEXES = {
+    'cleaned': [
+        ('cleaned_dims', ['university', 'school', 'degree', 'year']),
+        ('cleaned_degree_year', ['degree', 'year']),
+        ('cleaned_year', ['year']),
+    ],
+    'grouped': [
+        ('grouped_key', ['degree', 'university', 'year']),
+        ('grouped_university', ['university', 'degree']),
+        ('grouped_iqr', ['IQR']),
+        ('grouped_iqr_ratio', ['IQR_ratio']),
+    ],
+    'projections': [
+        ('projections_dims', ['university', 'degree']),
+    ],
+}
+
+# Aggregates that SQLite computes natively, named as in rollup.ROLLUP_STATS
+SQL_STATS = {
+    'count': 'COUNT({})',
+    'sum': 'SUM({})',
+    'mean': 'AVG({})',
+    'min': 'MIN({})',
+    'max': 'MAX({})',
+}
+
+_build_lock = threading.Lock()
+_checked = {}
+_local = threading.local()
+_derived = {}
+_derived_lock = threading.Lock()
+
+
+def sql_table(file_path):
+    """
+    Name of the database table serving a dataset, or None.
+
+    None means the caller should use the in-memory dataset store: the SQLite
+    backend is off, or the file is not one of SQL_TABLES.
+    """
+    if BACKEND != 'sqlite':
+        return None
+    path = os.path.abspath(file_path)
+    for table, source in SQL_TABLES.items():
+        if os.path.abspath(source) == path:
+            return table
+    return None
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def build_database(db_path=SQLITE_PATH):
+    """
+    Load every source CSV into a fresh SQLite file and index it.
+
+    CSVs are streamed in chunks, so building never needs a whole dataset in
+    memory. The file is written next to its target and renamed over it, so
+    open readers keep the old version until they reconnect.
+
+    Args:
+        db_path: Path of the database file
+
+    Returns:
+        str: db_path
+    """
+    tmp = f'{db_path}.{os.getpid()}.tmp'
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    with closing(sqlite3.connect(tmp)) as conn:
+        conn.execute('CREATE TABLE meta (name TEXT PRIMARY KEY, source TEXT, digest TEXT)')
+        for table, source in SQL_TABLES.items():
+            if not os.path.exists(source):
+                continue
+            # Hash first: if the file changes while loading, the next check rebuilds
+            digest = file_digest(source)
+            columns = []
+            for chunk in pd.read_csv(source, chunksize=BUILD_CHUNK_ROWS):
+                chunk.to_sql(table, conn, if_exists='append', index=False)
+                columns = list(chunk.columns)
+            for name, index_columns in SQL_INDEXES.get(table, []):
+                present = [c for c in index_columns if c in columns]
+                if present:
+                    conn.execute(f'CREATE INDEX {_quote(name)} ON {_quote(table)} ({", ".join(map(_quote, present))})')
+            conn.execute('INSERT INTO meta VALUES (?, ?, ?)', (table, source, digest))
+        conn.execute('ANALYZE')
+        conn.commit()
+    os.replace(tmp, db_path)
+    return db_path
+
+
+def _source_digests():
+    return {table: file_digest(source) for table, source in SQL_TABLES.items() if os.path.exists(source)}
+
+
+def _stored_digests(db_path):
+    try:
+        with closing(sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)) as conn:
+            return dict(conn.execute('SELECT name, digest FROM meta'))
+    except sqlite3.Error:
+        return None
+
+
+def ensure_database(db_path=SQLITE_PATH):
+    """
+    Make sure the database matches the current CSVs, rebuilding it if not.
+
+    Returns:
+        str: Version of the database (hash of its source digests)
+    """
+    wanted = _source_digests()
+    with _build_lock:
+        if _checked.get(db_path) != wanted:
+            if _stored_digests(db_path) != wanted:
+                with span('load'):
+                    build_database(db_path)
+            _checked[db_path] = wanted
+    return hashlib.sha1(repr(sorted(wanted.items())).encode()).hexdigest()
+
+
+def _connection():
+    """Read-only connection of this thread, reopened after a rebuild replaced the file."""
+    version = ensure_database()
+    conn = getattr(_local, 'conn', None)
+    if conn is None or _local.version != version:
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(f'file:{SQLITE_PATH}?mode=ro', uri=True, check_same_thread=False)
+        _local.conn, _local.version = conn, version
+    return conn
+
+
+def _param(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def where_clause(filters):
+    """
+    SQL condition for exact-match filters.
+
+    Args:
+        filters: Mapping of column -> value or list of values (None is skipped)
+
+    Returns:
+        tuple: (sql, params) where sql is '' or starts with ' WHERE'
+    """
+    clauses, params = [], []
+    for column, value in (filters or {}).items():
+        if value is None:
+            continue
+        values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+        clauses.append(f'{_quote(column)} IN ({", ".join("?" * len(values))})')
+        params += [_param(v) for v in values]
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def execute(sql, params=()):
+    """Run a query and return all result rows as tuples."""
+    with span('query'):
+        return _connection().execute(sql, [_param(p) for p in params]).fetchall()
+
+
+def read_sql(sql, params=()) -> pd.DataFrame:
+    """Run a query and return the result as a DataFrame."""
+    with span('query'):
+        return pd.read_sql_query(sql, _connection(), params=[_param(p) for p in params])
+
+
+def table_columns(table):
+    """Column name -> declared SQLite type of a table."""
+    return {name: decl for _, name, decl, *_ in execute(f'PRAGMA table_info({_quote(table)})')}
+
+
+def select_rows(table, columns=None, filters=None, sort=None, descending=False, limit=None, offset=0):
+    """
+    Filtered, sorted page of a table (NULLs sort last, ties keep file order).
+
+    Returns:
+        tuple: (column names, list of row tuples)
+    """
+    where, params = where_clause(filters)
+    select = ', '.join(map(_quote, columns)) if columns else '*'
+    order = f'{_quote(sort)} {"DESC" if descending else "ASC"} NULLS LAST, rowid' if sort else 'rowid'
+    sql = f'SELECT {select} FROM {_quote(table)}{where} ORDER BY {order}'
+    if limit is not None:
+        sql += ' LIMIT ? OFFSET ?'
+        params += [int(limit), int(offset)]
+    with span('query'):
+        cursor = _connection().execute(sql, params)
+        rows = cursor.fetchall()
+    return [d[0] for d in cursor.description], rows
+
+
+def select_frame(table, columns=None, filters=None, sort=None, descending=False, limit=None, offset=0):
+    """select_rows as a DataFrame."""
+    names, rows = select_rows(table, columns, filters, sort, descending, limit, offset)
+    return pd.DataFrame.from_records(rows, columns=names)
+
+
+def count_rows(table, filters=None):
+    """Number of rows of a table matching the filters."""
+    where, params = where_clause(filters)
+    return int(execute(f'SELECT COUNT(*) FROM {_quote(table)}{where}', params)[0][0])
+
+
+def distinct_values(table, column, filters=None, order='value', not_null=()):
+    """
+    Distinct non-null values of a column among the filtered rows.
+
+    Args:
+        table: Table name
+        column: Column to list
+        filters: Mapping of column -> value or list of values (optional)
+        order: 'value' for sorted values, 'first' for order of first appearance
+        not_null: Further columns that must be present in a row for it to count
+    """
+    where, params = where_clause(filters)
+    present = ' AND '.join(f'{_quote(c)} IS NOT NULL' for c in [column, *not_null])
+    where = f'{where} AND {present}' if where else f' WHERE {present}'
+    order_by = 'MIN(rowid)' if order == 'first' else _quote(column)
+    sql = f'SELECT {_quote(column)} FROM {_quote(table)}{where} GROUP BY {_quote(column)} ORDER BY {order_by}'
+    return [row[0] for row in execute(sql, params)]
+
+
+def aggregate(table, group_by, metrics, filters=None, stats=('mean',)) -> pd.DataFrame:
+    """
+    Grouped aggregates computed inside the database.
+
+    Rows with a missing group key are left out, as in a pandas groupby.
+
+    Args:
+        table: Table name
+        group_by: Columns to group by
+        metrics: Columns to aggregate
+        filters: Mapping of column -> value or list of values (optional)
+        stats: Statistics from SQL_STATS
+
+    Returns:
+        DataFrame with the group_by columns, then one `{metric}_{stat}` column
+        per metric and statistic, sorted by the group_by columns
+
+    Raises:
+        ValueError: If a statistic is not supported
+    """
+    unknown = [s for s in stats if s not in SQL_STATS]
+    if unknown:
+        raise ValueError(f"Unsupported statistic(s): {', '.join(unknown)}")
+    group_by = list(group_by)
+    where, params = where_clause(filters)
+    keys_present = ' AND '.join(f'{_quote(c)} IS NOT NULL' for c in group_by)
+    if keys_present:
+        where = f'{where} AND {keys_present}' if where else f' WHERE {keys_present}'
+
+    selected = [_quote(c) for c in group_by] + [
+        f'{SQL_STATS[s].format(_quote(m))} AS {_quote(f"{m}_{s}")}' for m in metrics for s in stats
+    ]
+    sql = f'SELECT {", ".join(selected)} FROM {_quote(table)}{where}'
+    if group_by:
+        keys = ', '.join(map(_quote, group_by))
+        sql += f' GROUP BY {keys} ORDER BY {keys}'
+    return read_sql(sql, params)
+
+
+def sql_derived(name, builder):
+    """
+    Get a value computed from the database, memoised per database version.
+
+    The SQL counterpart of dataset_store.get_derived, for small results such
+    as the dropdown hierarchy.
+
+    Args:
+        name: Key identifying the derived value
+        builder: Callable without arguments returning the value
+    """
+    version = ensure_database()
+    with _derived_lock:
+        cached = _derived.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+    value = builder()
+    with _derived_lock:
+        _derived[name] = (version, value)
+    return value
+
+
+# Script to (re)build the database from the CSVs
+if __name__ == '__main__':
+    print(f'Built {build_database()}')
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+
+from analytics import get_trend_table
+from data_helpers import get_dimension_index, get_grouped_index
+from dataset_store import CLEANED_CSV, GROUPED_CSV, get_dataset
+from function5_projection import get_projection_table
+from quantile_sketch import get_spread_sketches
+from rankings import get_rankings_cube
+from relationship_analysis import get_correlation_cube
+from rollup import get_rollup_cube
+from salary_analysis import SPREAD_METRICS, get_salary_lookup, get_spread_order, load_grouped_data
+from sql_backend import BACKEND, ensure_database
+
+# Configuration (environment variables, so every WSGI worker agrees)
+#   WARMUP   background (default): warm in a thread while the worker starts serving
+#            sync: finish warming before the WSGI module finishes loading
+#            off: build everything lazily on first use
+WARMUP_MODE = os.environ.get('WARMUP', 'background').lower()
+
+
+def _dimension_indexes():
+    get_dimension_index(CLEANED_CSV)
+    get_grouped_index(GROUPED_CSV)
+
+
+def _spread_indexes():
+    load_grouped_data(GROUPED_CSV)
+    for descending in (True, False):
+        get_spread_order(GROUPED_CSV, SPREAD_METRICS[0], descending)
+    get_salary_lookup(GROUPED_CSV)
+
+
+# Cheapest first: datasets, then the indexes and tables built from them
+WARMUP_STEPS = [
+    ('load_cleaned', lambda: get_dataset(CLEANED_CSV)),
+    ('load_grouped', lambda: get_dataset(GROUPED_CSV)),
+    ('dimension_indexes', _dimension_indexes),
+    ('spread_indexes', _spread_indexes),
+    ('projection_table', lambda: get_projection_table(CLEANED_CSV)),
+    ('rollup_cube', lambda: get_rollup_cube(CLEANED_CSV)),
+    ('spread_sketches', lambda: get_spread_sketches(CLEANED_CSV)),
+    ('rankings_cube', lambda: get_rankings_cube(CLEANED_CSV)),
+    ('trend_table', lambda: get_trend_table(CLEANED_CSV)),
+    ('correlation_cube', lambda: get_correlation_cube(CLEANED_CSV)),
+]
+if BACKEND == 'sqlite':
+    # Build (or validate) the database before anything queries it
+    WARMUP_STEPS.insert(0, ('sqlite_database', ensure_database))
+
+
+class WarmupState:
+    """Progress of this worker's warm-up, as reported by the readiness endpoint."""
+
+    def __init__(self):
+        self.status = 'idle'  # idle -> running -> ready | failed
+        self.steps = {}
+        self.error = None
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.status == 'ready'
+
+    def describe(self):
+        with self._lock:
+            info = {
+                'status': self.status,
+                'ready': self.status == 'ready',
+                'steps_ms': dict(self.steps),
+                'pid': os.getpid(),
+            }
+            if self.started is not None:
+                end = self.finished or time.time()
+                info['elapsed_ms'] = round((end - self.started) * 1000, 1)
+            if self.error:
+                info['error'] = self.error
+            return info
+
+
+state = WarmupState()
+
+
+def warm_up(steps=None):
+    """
+    Load the datasets and build every derived table the routes use.
+
+    A failing step is recorded and stops the warm-up; the worker still
+    serves requests (building lazily), it just never reports ready.
+
+    Args:
+        steps: (name, callable) pairs to run (default: WARMUP_STEPS)
+
+    Returns:
+        bool: True when every step succeeded
+    """
+    with state._lock:
+        if state.status == 'running':
+            return False
+        state.status = 'running'
+        state.started = time.time()
+        state.finished = None
+        state.error = None
+        state.steps = {}
+
+    for name, step in steps or WARMUP_STEPS:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            with state._lock:
+                state.status = 'failed'
+                state.error = f'{name}: {e}'
+                state.finished = time.time()
+            return False
+        with state._lock:
+            state.steps[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    with state._lock:
+        state.status = 'ready'
+        state.finished = time.time()
+    return True
+
+
+def start_warm_up(mode=WARMUP_MODE):
+    """
+    Warm up according to `mode` (see WARMUP).
+
+    With mode 'off' the worker is reported ready straight away, since there
+    is nothing to wait for.
+    """
+    if mode == 'off':
+        with state._lock:
+            state.status = 'ready'
+        return
+    if mode == 'sync':
+        warm_up()
+        return
+    threading.Thread(target=warm_up, name='warmup', daemon=True).start()
@@ -1,4 +1,16 @@
-from app.app import app
+import os
+import sys
+
+# The app modules import each other by flat module name (as when running app/app.py),
+# so app/ goes on the path and `app` below is app/app.py itself
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from app import app
+from warmup import start_warm_up
+
+# Build datasets, indexes and derived tables now rather than on the first request;
+# /ready answers 503 until this worker is warm (see WARMUP in app/warmup.py)
+start_warm_up()
 
 # Elastic Beanstalk expects a module-level variable named `application`
 application = app
@@ -0,0 +1,314 @@
+"""
+Benchmark suite for the analysis functions and Flask routes.
+
+Every case runs against the shipped CSVs and against synthetic datasets
+about 10x, 100x, ... as large, made by synthetic_data.py from cleaned.csv. Each scale runs in its own
+worker process with GES_DATA_DIR pointing at its data, so module-level paths
+and caches never mix between scales. The response cache is switched off so
+routes measure real work.
+
+Reported per case:
+    cold_ms        first call in a fresh worker (dataset load + derived tables)
+    p50/p95/p99_ms warm calls (everything already cached per dataset version)
+    peak_mb        peak Python memory allocated during the cold call
+    rows_per_sec   source rows processed per second on the cold call
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --scales 1 10 100 1000 --repeat 50 --no-memory
+    python benchmarks/run_benchmarks.py --save-baseline local
+    python benchmarks/run_benchmarks.py --compare local --fail-on-regression
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(ROOT, 'app')
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+# 100x and 1000x are opt-in (--scales): cold precomputation there takes minutes
+DEFAULT_SCALES = [1, 10]
+DEFAULT_REPEAT = 20
+# A case regresses when its time exceeds the baseline by more than this factor
+DEFAULT_THRESHOLD = 1.5
+
+
+# ---------------------------------------------------------------------------
+# Scaled datasets
+# ---------------------------------------------------------------------------
+
+def prepare_data_dir(scale: int, directory: str) -> str:
+    """
+    Write cleaned.csv, raw.csv and grouped_salary_analysis.csv for one scale.
+
+    Scale 1 uses the shipped files; larger scales come from the synthetic
+    generator with `scale` degree variants per source degree.
+    """
+    sys.path.insert(0, ROOT)
+    from synthetic_data import generate, write_dataset
+
+    os.makedirs(directory, exist_ok=True)
+    if scale == 1:
+        for name in ('cleaned.csv', 'raw.csv', 'grouped_salary_analysis.csv'):
+            shutil.copy(os.path.join(ROOT, name), os.path.join(directory, name))
+        return directory
+
+    cleaned = pd.read_csv(os.path.join(ROOT, 'cleaned.csv'), encoding='utf-8-sig')
+    write_dataset(generate(cleaned, degree_factor=scale), directory, columnar=False, derive=True)
+    return directory
+
+
+# ---------------------------------------------------------------------------
+# Worker: runs inside a process whose GES_DATA_DIR points at one scale
+# ---------------------------------------------------------------------------
+
+def _cases():
+    """(kind, name, source_csv, callable) for every benchmarked function and route."""
+    sys.path.insert(0, APP_DIR)
+    os.chdir(APP_DIR)
+    from urllib.parse import urlencode
+
+    import dataset_store
+    from dataset_store import CLEANED_CSV, GROUPED_CSV, get_dataset
+    from analytics import analyze_trends
+    from rankings import rankings
+    from salary_analysis import calculate_iqr_analysis
+    from function5_projection import calculate_salary_projections
+    from relationship_analysis import employment_rate_vs_salary
+    from app import app
+
+    df = get_dataset(CLEANED_CSV)
+    university = str(df['university'].value_counts().index[0])
+    year = int(df['year'].max())
+    dataset_store.clear()
+
+    client = app.test_client()
+
+    def route(url):
+        def call():
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+            return response.data
+        return call
+
+    uni = urlencode({'university': university})
+    return [
+        ('function', 'rankings', CLEANED_CSV,
+         lambda: rankings(CLEANED_CSV, year=year, n=10, include_most_improved=True)),
+        ('function', 'analyze_trends', CLEANED_CSV,
+         lambda: analyze_trends(CLEANED_CSV, university, None, None, 3)),
+        ('function', 'calculate_iqr_analysis', GROUPED_CSV,
+         lambda: calculate_iqr_analysis(GROUPED_CSV)),
+        ('function', 'calculate_salary_projections', CLEANED_CSV,
+         lambda: calculate_salary_projections()),
+        ('function', 'employment_rate_vs_salary', CLEANED_CSV,
+         lambda: employment_rate_vs_salary(get_dataset(CLEANED_CSV))),
+        ('route', '/', CLEANED_CSV, route('/')),
+        ('route', '/function1', CLEANED_CSV, route(f'/function1?{uni}&rolling_window=3')),
+        ('route', '/function2', GROUPED_CSV, route('/function2')),
+        ('route', '/function3', CLEANED_CSV, route(f'/function3?year={year}&include_most_improved=1')),
+        ('route', '/function4', CLEANED_CSV, route(f'/function4?{uni}')),
+        ('route', '/function5', CLEANED_CSV, route('/function5')),
+        ('route', '/api/v1/trends', CLEANED_CSV, route(f'/api/v1/trends?{uni}')),
+        ('route', '/api/v1/salary-spread', GROUPED_CSV, route('/api/v1/salary-spread')),
+        ('route', '/api/v1/rankings', CLEANED_CSV, route(f'/api/v1/rankings?year={year}')),
+        ('route', '/api/v1/relationship', CLEANED_CSV, route(f'/api/v1/relationship?{uni}')),
+        ('route', '/api/v1/projections', CLEANED_CSV, route('/api/v1/projections?limit=20')),
+        ('route', '/api/dimensions', CLEANED_CSV, route('/api/dimensions')),
+        ('route', '/api/table/cleaned', CLEANED_CSV,
+         route('/api/table/cleaned?offset=100&limit=50&sort=gross_monthly_median&order=desc')),
+        ('route', '/get_filtered_data', GROUPED_CSV, route(
+            '/get_filtered_data?' + urlencode(_first_grouped_key(GROUPED_CSV)))),
+    ]
+
+
+def _first_grouped_key(grouped_csv):
+    from dataset_store import get_dataset
+    row = get_dataset(grouped_csv).iloc[0]
+    return {'degree': row['degree'], 'university': row['university'], 'year': int(row['year'])}
+
+
+def _measure(fn, rows, repeat, memory=True):
+    import dataset_store
+
+    # Cold: a fresh worker has nothing loaded or derived yet
+    dataset_store.clear()
+    start = time.perf_counter()
+    fn()
+    cold = time.perf_counter() - start
+
+    # tracemalloc slows allocation-heavy code a lot, so it gets its own cold run
+    peak = None
+    if memory:
+        dataset_store.clear()
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        warm.append(time.perf_counter() - start)
+    warm_ms = np.array(warm) * 1000
+
+    return {
+        'rows': rows,
+        'cold_ms': round(cold * 1000, 3),
+        'p50_ms': round(float(np.percentile(warm_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(warm_ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(warm_ms, 99)), 3),
+        'mean_ms': round(float(warm_ms.mean()), 3),
+        'peak_mb': round(peak / (1024 * 1024), 3) if peak is not None else None,
+        'rows_per_sec': round(rows / cold) if cold > 0 else None,
+    }
+
+
+def run_worker(repeat, only=None, memory=True):
+    """Measure every case for the dataset in GES_DATA_DIR and return the results."""
+    cases = _cases()
+    from dataset_store import get_dataset
+
+    results = {}
+    for kind, name, source, fn in cases:
+        if only and not any(o in name for o in only):
+            continue
+        rows = len(get_dataset(source))
+        results[f'{kind}:{name}'] = _measure(fn, rows, repeat, memory)
+    return results
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def run_scale(scale, repeat, only, work_dir, memory=True):
+    data_dir = prepare_data_dir(scale, os.path.join(work_dir, f'{scale}x'))
+    env = dict(os.environ, GES_DATA_DIR=data_dir, RESPONSE_CACHE='off')
+    command = [sys.executable, os.path.abspath(__file__), '--worker', '--repeat', str(repeat)]
+    if only:
+        command += ['--only', *only]
+    if not memory:
+        command.append('--no-memory')
+    output = subprocess.run(command, env=env, check=True, stdout=subprocess.PIPE, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _baseline_path(name):
+    return os.path.join(BASELINE_DIR, f'{name}.json')
+
+
+def save_baseline(name, report):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    with open(_baseline_path(name), 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f'Saved baseline -> {_baseline_path(name)}')
+
+
+def load_baseline(name):
+    with open(_baseline_path(name)) as f:
+        return json.load(f)
+
+
+def _optional(value):
+    return '-' if value is None else f'{value:.2f}'
+
+
+def print_report(report, baseline=None, threshold=DEFAULT_THRESHOLD):
+    """Print one line per case; returns the names of regressed cases."""
+    regressions = []
+    header = f"{'case':<50} {'rows':>9} {'cold_ms':>10} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'peak_mb':>8} {'rows/s':>12}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header)
+    print('-' * len(header))
+
+    base_results = (baseline or {}).get('results', {})
+    for key, r in report['results'].items():
+        line = (f"{key:<50} {r['rows']:>9} {r['cold_ms']:>10.2f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} "
+                f"{r['p99_ms']:>9.3f} {_optional(r['peak_mb']):>8} {r['rows_per_sec'] or 0:>12,}")
+        base = base_results.get(key)
+        if baseline and base:
+            # Warm p50 is the steady-state cost; cold covers load + precomputation
+            ratio = max(r['p50_ms'] / max(base['p50_ms'], 1e-3), r['cold_ms'] / max(base['cold_ms'], 1e-3))
+            flag = ' REGRESSION' if ratio > threshold else ''
+            line += f' {ratio:>7.2f}x{flag}'
+            if flag:
+                regressions.append(key)
+        elif baseline:
+            line += f" {'new':>8}"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the analysis functions and Flask routes.')
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES,
+                        help='row multipliers of cleaned.csv to benchmark')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='warm calls per case')
+    parser.add_argument('--only', nargs='+', help='only cases whose name contains one of these strings')
+    parser.add_argument('--save-baseline', metavar='NAME', help='store the results as a named baseline')
+    parser.add_argument('--compare', metavar='NAME', help='compare against a stored baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='slowdown factor reported as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true', help='exit with status 1 on regressions')
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory (tracemalloc) run')
+    parser.add_argument('--work-dir', help='where scaled datasets are written (default: a temp dir)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.repeat, args.only, not args.no_memory)))
+        return 0
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='ges-bench-')
+    results = {}
+    try:
+        for scale in args.scales:
+            print(f'Running {scale}x ...', file=sys.stderr)
+            for key, value in run_scale(scale, args.repeat, args.only, work_dir, not args.no_memory).items():
+                results[f'{scale}x {key}'] = value
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+
+    baseline = load_baseline(args.compare) if args.compare else None
+    regressions = print_report(report, baseline, args.threshold)
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, report)
+    if regressions:
+        print(f'\n{len(regressions)} regression(s) above {args.threshold}x', file=sys.stderr)
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
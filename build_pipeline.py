@@ -0,0 +1,378 @@
+"""
+Incremental build of the derived datasets.
+
+The outputs form a small DAG:
+
+    survey CSV -> cleaned.csv -> grouped_salary_analysis.csv
+                              -> function5_data.csv
+                              -> employment_rate_vs_salary.csv, ft_perm_vs_salary.csv,
+                                 relationship_summary.csv
+
+A manifest (.cache/pipeline.json in the data directory) records the content
+hash of every stage's inputs, outputs and code. A stage runs only when one of
+them changed, so an upstream rebuild that produces byte-identical output
+stops there. Stages whose inputs are ready run in parallel processes.
+
+Stages that work per partition also record a hash per partition of their
+input (survey year, or degree and university) and, when only some partitions
+changed (e.g. a new survey year was appended), recompute just those and keep
+the other rows of their previous output.
+
+Usage:
+    python build_pipeline.py
+    python build_pipeline.py --dry-run
+    python build_pipeline.py --data-dir synthetic --jobs 4
+    python build_pipeline.py --force grouped projections
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(ROOT, "app")
+MANIFEST = os.path.join(".cache", "pipeline.json")
+
+
+class Stage:
+    """One node of the build DAG; paths are relative to the data directory."""
+
+    def __init__(self, name, inputs, outputs, code, run):
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.code = list(code)  # source files (relative to the repo) whose changes invalidate the outputs
+        self.run = run
+
+
+# ---------------------------------------------------------------------------
+# Hashing
+# ---------------------------------------------------------------------------
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def code_digest(files: list) -> str:
+    h = hashlib.sha1()
+    for name in files:
+        h.update(name.encode())
+        h.update(file_digest(os.path.join(ROOT, name)).encode())
+    return h.hexdigest()
+
+
+def partition_digests(df: pd.DataFrame, keys: list) -> dict:
+    """
+    Content hash of the rows of every partition of a frame.
+
+    Args:
+        df: Frame to partition (row order within a partition counts)
+        keys: Partition columns
+
+    Returns:
+        dict: JSON-encoded partition key -> SHA-1 of its rows
+    """
+    rows = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    digests = {}
+    for key, positions in df.groupby(keys, observed=True, sort=True).indices.items():
+        key = key if isinstance(key, tuple) else (key,)
+        name = json.dumps([k.item() if hasattr(k, "item") else k for k in key])
+        digests[name] = hashlib.sha1(rows[positions].tobytes()).hexdigest()
+    return digests
+
+
+def changed_partitions(previous: dict, current: dict):
+    """Partition keys that are new or whose rows changed, and keys that disappeared."""
+    changed = {k for k, digest in current.items() if previous.get(k) != digest}
+    removed = set(previous) - set(current)
+    return changed, removed
+
+
+def _keys(names: set) -> list:
+    return [tuple(json.loads(name)) for name in names]
+
+
+# ---------------------------------------------------------------------------
+# Stages (run in pool processes)
+# ---------------------------------------------------------------------------
+
+def _init_worker(app_dir):
+    # data_cleaning imports from the app package, so it is loaded before app/
+    # goes on the path (after that `app` is app/app.py, as in synthetic_data.py);
+    # the other stages use the app modules' flat imports
+    import data_cleaning  # noqa: F401
+    if app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+
+
+def _write(df: pd.DataFrame, path: str):
+    from dataset_store import write_columnar
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    df.to_csv(tmp, index=False)
+    # An identical rebuild leaves the file (and checked-in copies) untouched
+    if os.path.exists(path) and file_digest(tmp) == file_digest(path):
+        os.remove(tmp)
+    else:
+        os.replace(tmp, path)
+    # Typed from the file itself, since merged outputs are assembled as text
+    write_columnar(pd.read_csv(path), path)
+
+
+def _as_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Values as a full build writes them, so fresh rows line up with rows kept from the file."""
+    return pd.read_csv(io.StringIO(df.to_csv(index=False)), dtype=str)
+
+
+def build_cleaned(data_dir, stage, previous):
+    """
+    Clean the survey file. Years already cleaned are kept when only new years were appended.
+    """
+    from data_cleaning import run_pipeline
+
+    source, output = (os.path.join(data_dir, p) for p in (stage.inputs[0], stage.outputs[0]))
+    raw = pd.read_csv(source, dtype=str, encoding="utf-8-sig")
+    partitions = partition_digests(raw, ["year"])
+    old = previous.get("partitions")
+
+    # Appending is only valid when every previously cleaned year is untouched
+    changed, removed = changed_partitions(old or {}, partitions)
+    append = old is not None and os.path.exists(output) and not removed and not (changed & set(old))
+    run_pipeline(source, output, append=append)
+    return {"partitions": partitions, "recomputed": len(changed) if append else len(partitions),
+            "partition_count": len(partitions)}
+
+
+def build_grouped(data_dir, stage, previous):
+    """Salary spread per (degree, university, year); recomputed per survey year."""
+    from dataset_store import get_dataset
+    from salary_analysis import build_grouped_salary_data
+
+    source, output = (os.path.join(data_dir, p) for p in (stage.inputs[0], stage.outputs[0]))
+    data = get_dataset(source)
+    partitions = partition_digests(data, ["year"])
+    changed, removed = changed_partitions(previous.get("partitions") or {}, partitions)
+
+    if previous.get("partitions") is None or not os.path.exists(output):
+        grouped = build_grouped_salary_data(data)
+        recomputed = len(partitions)
+    else:
+        years = [key[0] for key in _keys(changed | removed)]
+        # Kept as text so existing rows are written back unchanged
+        existing = pd.read_csv(output, dtype=str)
+        kept = existing[~existing["year"].astype(int).isin(years)]
+        fresh = _as_text(build_grouped_salary_data(data[data["year"].isin(years)]))
+        grouped = (
+            pd.concat([kept, fresh], ignore_index=True)
+            .sort_values(["degree", "university", "year"], kind="mergesort",
+                         key=lambda col: col.astype(int) if col.name == "year" else col)
+            .reset_index(drop=True)
+        )
+        recomputed = len(changed)
+
+    _write(grouped, output)
+    return {"partitions": partitions, "recomputed": recomputed, "partition_count": len(partitions)}
+
+
+def build_projections(data_dir, stage, previous):
+    """Salary projections per (degree, university); only groups whose rows changed are refitted."""
+    from dataset_store import get_dataset
+    from function5_projection import batch_linear_trends, N_YEARS, FORECAST_YEAR
+
+    source, output = (os.path.join(data_dir, p) for p in (stage.inputs[0], stage.outputs[0]))
+    data = get_dataset(source)
+    keys = ["degree", "university"]
+    partitions = partition_digests(data[keys + ["year", "gross_monthly_median"]], keys)
+    changed, removed = changed_partitions(previous.get("partitions") or {}, partitions)
+
+    if previous.get("partitions") is None or not os.path.exists(output):
+        fresh = batch_linear_trends(data, N_YEARS, FORECAST_YEAR)
+        kept = fresh.iloc[0:0]
+        recomputed = len(partitions)
+    else:
+        stale = pd.MultiIndex.from_tuples(_keys(changed | removed) or [("", "")], names=keys)
+        existing = pd.read_csv(output, dtype=str)
+        kept = existing[~pd.MultiIndex.from_frame(existing[keys]).isin(stale)]
+        fresh = _as_text(batch_linear_trends(data[pd.MultiIndex.from_frame(data[keys]).isin(stale)], N_YEARS, FORECAST_YEAR))
+        recomputed = len(changed)
+
+    # Same order as a full build: groups by key, then stable by predicted median
+    projections = (
+        pd.concat([kept, fresh], ignore_index=True)
+        .sort_values(keys, kind="mergesort")
+        .sort_values("predicted_median_2024", ascending=False, kind="mergesort",
+                     key=lambda col: col.astype(float))
+        .reset_index(drop=True)
+    )
+    _write(projections, output)
+    return {"partitions": partitions, "recomputed": recomputed, "partition_count": len(partitions)}
+
+
+def build_relationship(data_dir, stage, previous):
+    """Relationship tables and summary; the correlations span all rows, so always in full."""
+    from relationship_analysis import save_relationship_outputs
+
+    save_relationship_outputs(os.path.join(data_dir, stage.inputs[0]), data_dir)
+    return {}
+
+
+STAGES = [
+    Stage("cleaned", ["GraduateEmploymentSurveyNTUNUSSITSMUSUSSSUTD.csv"], ["cleaned.csv"],
+          ["data_cleaning.py", "app/dataset_store.py"], build_cleaned),
+    Stage("grouped", ["cleaned.csv"], ["grouped_salary_analysis.csv"],
+          ["app/salary_analysis.py", "app/dataset_store.py"], build_grouped),
+    Stage("projections", ["cleaned.csv"], ["function5_data.csv"],
+          ["app/function5_projection.py", "app/dataset_store.py"], build_projections),
+    Stage("relationship", ["cleaned.csv"],
+          ["employment_rate_vs_salary.csv", "ft_perm_vs_salary.csv", "relationship_summary.csv"],
+          ["app/relationship_analysis.py", "app/dataset_store.py"], build_relationship),
+]
+
+
+def _run_stage(data_dir, name, previous):
+    stage = next(s for s in STAGES if s.name == name)
+    start = time.perf_counter()
+    result = stage.run(data_dir, stage, previous)
+    return dict(result, seconds=round(time.perf_counter() - start, 3))
+
+
+# ---------------------------------------------------------------------------
+# Scheduling
+# ---------------------------------------------------------------------------
+
+def dependencies(stages=STAGES) -> dict:
+    """Stage name -> names of the stages producing its inputs."""
+    producers = {out: s.name for s in stages for out in s.outputs}
+    return {s.name: {producers[i] for i in s.inputs if i in producers} for s in stages}
+
+
+def load_manifest(data_dir) -> dict:
+    try:
+        with open(os.path.join(data_dir, MANIFEST), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"stages": {}}
+
+
+def save_manifest(data_dir, manifest):
+    path = os.path.join(data_dir, MANIFEST)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _digests(data_dir, names):
+    paths = {name: os.path.join(data_dir, name) for name in names}
+    return {name: file_digest(p) if os.path.exists(p) else None for name, p in paths.items()}
+
+
+def stale_reason(data_dir, stage, record):
+    """Why a stage has to run, or None when its outputs are up to date."""
+    if not record:
+        return "never built"
+    if record.get("code") != code_digest(stage.code):
+        return "code changed"
+    if record.get("inputs") != _digests(data_dir, stage.inputs):
+        return "input changed"
+    if record.get("outputs") != _digests(data_dir, stage.outputs):
+        return "output missing or modified"
+    return None
+
+
+def build(data_dir=ROOT, jobs=None, force=(), dry_run=False, stages=STAGES) -> dict:
+    """
+    Bring every stage up to date, running independent stages in parallel.
+
+    Args:
+        data_dir: Directory holding the survey CSV and the derived files
+        jobs: Worker processes (default: one per CPU)
+        force: Stage names to rebuild in full regardless of their hashes
+        dry_run: Only report which stages would run
+        stages: The DAG
+
+    Returns:
+        dict: stage name -> 'up to date', 'would run: <reason>' or the stage's result
+    """
+    data_dir = os.path.abspath(data_dir)
+    manifest = load_manifest(data_dir)
+    records = manifest.setdefault("stages", {})
+    deps = dependencies(stages)
+    by_name = {s.name: s for s in stages}
+    missing = [s.inputs[0] for s in stages if not deps[s.name] and not os.path.exists(os.path.join(data_dir, s.inputs[0]))]
+    if missing:
+        raise FileNotFoundError(f"Missing source file(s) in {data_dir}: {', '.join(missing)}")
+
+    done, running, report = set(), {}, {}
+    rebuilt = set()
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(APP_DIR,)) as pool:
+        while len(done) < len(stages):
+            for stage in stages:
+                if stage.name in done or stage.name in running.values() or not deps[stage.name] <= done:
+                    continue
+                record = records.get(stage.name)
+                reason = "forced" if stage.name in force else stale_reason(data_dir, stage, record)
+                if dry_run and reason is None and deps[stage.name] & rebuilt:
+                    reason = "upstream would run"
+                if reason is None:
+                    report[stage.name] = "up to date"
+                    done.add(stage.name)
+                elif dry_run:
+                    report[stage.name] = f"would run: {reason}"
+                    rebuilt.add(stage.name)
+                    done.add(stage.name)
+                else:
+                    # Partitions are only reusable when nothing but the inputs changed
+                    previous = record if reason == "input changed" else {}
+                    print(f"{stage.name}: running ({reason})")
+                    running[pool.submit(_run_stage, data_dir, stage.name, previous)] = stage.name
+            if not running:
+                continue
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                stage = by_name[name]
+                result = future.result()  # a failing stage stops the build
+                records[name] = dict(
+                    result,
+                    code=code_digest(stage.code),
+                    inputs=_digests(data_dir, stage.inputs),
+                    outputs=_digests(data_dir, stage.outputs),
+                    built=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                )
+                save_manifest(data_dir, manifest)
+                report[name] = {k: v for k, v in result.items() if k != "partitions"}
+                rebuilt.add(name)
+                done.add(name)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the derived datasets that are out of date.")
+    parser.add_argument("--data-dir", default=ROOT, help="directory with the survey CSV and derived files")
+    parser.add_argument("--jobs", type=int, help="parallel worker processes (default: CPU count)")
+    parser.add_argument("--force", nargs="*", metavar="STAGE",
+                        help="rebuild these stages in full (no stage names: all of them)")
+    parser.add_argument("--dry-run", action="store_true", help="only show what would run")
+    args = parser.parse_args()
+
+    names = [s.name for s in STAGES]
+    force = set(names) if args.force == [] else set(args.force or ())
+    unknown = force - set(names)
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(sorted(unknown))} (stages: {', '.join(names)})")
+
+    for name, outcome in build(args.data_dir, args.jobs, force, args.dry_run).items():
+        print(f"{name}: {outcome}")
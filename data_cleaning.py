@@ -1,10 +1,17 @@
-import pandas as pd
+import argparse
+import os
 import re
 import unicodedata
 
+import pandas as pd
+from app.dataset_store import write_columnar
+
 INPUT = "GraduateEmploymentSurveyNTUNUSSITSMUSUSSSUTD.csv"
 OUTPUT = "cleaned"
 
+# Rows are streamed through the pipeline in chunks of this size
+CHUNKSIZE = 50_000
+
 def fix_mojibake(s: str) -> str:
     """
     Fix common mojibake like 'ï¿½' (UTF-8 text that was decoded as latin1/cp1252).
@@ -41,65 +48,181 @@ def clean_text(x):
 
     return s
 
-# 1) Read original CSV as strings (keep placeholders like N.A. intact)
-df = pd.read_csv(INPUT, dtype=str, encoding="utf-8-sig")
-
-# 2) Define metric columns (E to L = index 4 to 11)
-metric_cols = df.columns[4:12].tolist()
-
-# 3) Clean TEXT columns (everything except metric columns)
-text_cols = [c for c in df.columns if c not in metric_cols]
-for c in text_cols:
-    df[c] = df[c].apply(clean_text)
-
-# 4) Clean METRIC columns (strip + standardize missing tokens)
-for c in metric_cols:
-    df[c] = df[c].astype(str).str.strip()
-
-# Make missing values consistent (covers N.A., NA, n.a., blanks, etc.)
-df[metric_cols] = df[metric_cols].replace(
-    to_replace=r"^(?:N\.?A\.?|NA|na|n\.?a\.?)$|^$",
-    value=pd.NA,
-    regex=True
-)
-
-# NEW: remove % symbols (and commas) before converting to numbers
-for c in metric_cols:
-    df[c] = (
-        df[c]
-        .astype(str)
-        .str.replace("%", "", regex=False)     # remove %
-        .str.replace(",", "", regex=False)     # remove thousands separators if any
-        .str.strip()
-    )
-
-# Convert metrics to numeric
-for c in metric_cols:
-    df[c] = pd.to_numeric(df[c], errors="coerce")
-
-# Drop rows where ANY metric column is missing/invalid
-df = df.dropna(subset=metric_cols, how="any")
-
-# 5) Drop rows where ANY metric column is missing
-df = df.dropna(subset=metric_cols, how="any")
-
-# (Optional) Convert metrics to numeric after cleaning
-for c in metric_cols:
-    df[c] = pd.to_numeric(df[c], errors="coerce")
-
-# If conversion creates NaN (from weird values), enforce again:
-df = df.dropna(subset=metric_cols, how="any")
-
-# 6) Quick sanity check: remaining “bad” characters in text columns
-bad_mask = df[text_cols].apply(
-    lambda col: col.astype(str).str.contains(r"[ï¿Ã\uFFFD\*\^#]", regex=True, na=False)
-).any(axis=1)
-
-print("Rows still suspicious:", int(bad_mask.sum()))
-if bad_mask.any():
-    print(df.loc[bad_mask, text_cols].head(10))
-
-# 7) Save cleaned output
-df.to_csv(OUTPUT, index=False, encoding="utf-8-sig")
-print(f"Saved -> {OUTPUT}")
-print("Final rows:", len(df))
+def clean_text_values(values: pd.Series) -> pd.Series:
+    """
+    Vectorised equivalent of clean_text for a Series of non-null strings.
+
+    Object dtype keeps Python's `re` semantics (e.g. Unicode-aware \\s), so the
+    result is identical to applying clean_text cell by cell.
+    """
+    s = pd.Series(values, dtype=object)
+
+    # Fix encoding artifacts only where typical patterns appear
+    suspect = s.str.contains("ï¿", regex=False) | s.str.contains("Ã", regex=False)
+    if suspect.any():
+        s[suspect] = s[suspect].map(fix_mojibake)
+
+    s = s.str.normalize("NFKC")
+    s = s.str.replace(r"[\*\^#]+", "", regex=True)
+    s = s.str.replace("\uFFFD", "", regex=False)
+    s = s.str.replace(r"[\u200B-\u200D\uFEFF]", "", regex=True)
+    s = s.str.replace("\xa0", " ", regex=False)
+    return s.str.replace(r"\s+", " ", regex=True).str.strip()
+
+def clean_text_column(col: pd.Series, memo: dict) -> pd.Series:
+    """
+    Clean a text column, working only on distinct values not seen before.
+
+    Args:
+        col: Raw text column
+        memo: Dict of raw string -> cleaned string, shared across columns and chunks
+
+    Returns:
+        Series with cleaned values (missing values stay missing)
+    """
+    new = [v for v in col.dropna().unique() if v not in memo]
+    if new:
+        memo.update(zip(new, clean_text_values(pd.Series(new, dtype=object))))
+    return col.map(memo)
+
+def clean_metric_columns(chunk: pd.DataFrame, metric_cols: list) -> pd.DataFrame:
+    """
+    Convert metric columns to numbers in one pass and drop incomplete rows.
+
+    Placeholders such as N.A., NA or blanks fail the numeric conversion and
+    become NaN, so a single dropna covers every missing/invalid case.
+    """
+    for c in metric_cols:
+        chunk[c] = pd.to_numeric(
+            chunk[c]
+            .astype(str)
+            .str.strip()
+            .str.replace("%", "", regex=False)     # remove %
+            .str.replace(",", "", regex=False)     # remove thousands separators if any
+            .str.strip(),
+            errors="coerce",
+        )
+    return chunk.dropna(subset=metric_cols, how="any")
+
+def clean_chunk(chunk: pd.DataFrame, metric_cols: list, memo: dict, skip_years=None) -> pd.DataFrame:
+    """
+    Clean one chunk of raw rows.
+
+    Args:
+        chunk: Raw rows read as strings
+        metric_cols: Names of the numeric metric columns
+        memo: Shared memo of already cleaned strings
+        skip_years: Cleaned year values to drop before any other work (optional)
+
+    Returns:
+        DataFrame of cleaned rows
+    """
+    chunk = chunk.copy()
+    text_cols = [c for c in chunk.columns if c not in metric_cols]
+
+    # Year first, so rows for years already cleaned are dropped before the rest
+    if "year" in text_cols:
+        chunk["year"] = clean_text_column(chunk["year"], memo)
+        if skip_years:
+            chunk = chunk[~chunk["year"].isin(skip_years)]
+
+    for c in text_cols:
+        if c != "year":
+            chunk[c] = clean_text_column(chunk[c], memo)
+
+    return clean_metric_columns(chunk, metric_cols)
+
+def iter_cleaned_chunks(input_path=INPUT, chunksize=CHUNKSIZE, skip_years=None, memo=None):
+    """
+    Stream the raw survey file and yield cleaned chunks.
+
+    Args:
+        input_path: Path to the raw CSV file
+        chunksize: Rows per chunk
+        skip_years: Cleaned year values to leave out (optional)
+        memo: Memo of cleaned strings to reuse (optional)
+
+    Yields:
+        tuple: (cleaned_chunk, metric_cols, text_cols)
+    """
+    memo = {} if memo is None else memo
+    # Read as strings (keep placeholders like N.A. intact until conversion)
+    reader = pd.read_csv(input_path, dtype=str, encoding="utf-8-sig", chunksize=chunksize)
+    for chunk in reader:
+        # Metric columns are E to L (index 4 to 11)
+        metric_cols = chunk.columns[4:12].tolist()
+        text_cols = [c for c in chunk.columns if c not in metric_cols]
+        yield clean_chunk(chunk, metric_cols, memo, skip_years), metric_cols, text_cols
+
+def report_suspicious(df: pd.DataFrame, text_cols: list) -> int:
+    """Print and count rows whose text still contains "bad" characters."""
+    bad_mask = df[text_cols].apply(
+        # Literal U+FFFD rather than a \u escape, which pyarrow-backed strings reject
+        lambda col: col.astype(str).str.contains("[ï¿Ã\uFFFD" + r"\*\^#]", regex=True, na=False)
+    ).any(axis=1)
+
+    print("Rows still suspicious:", int(bad_mask.sum()))
+    if bad_mask.any():
+        print(df.loc[bad_mask, text_cols].head(10))
+    return int(bad_mask.sum())
+
+def run_pipeline(input_path=INPUT, output_path=OUTPUT, append=False, chunksize=CHUNKSIZE) -> pd.DataFrame:
+    """
+    Clean the raw survey file and write the cleaned CSV (plus columnar copy).
+
+    Args:
+        input_path: Path to the raw CSV file
+        output_path: Path of the cleaned CSV to write
+        append: Only clean rows for years missing from the existing output and
+            add them to it, instead of re-cleaning everything
+        chunksize: Rows per chunk while streaming the raw file
+
+    Returns:
+        DataFrame: The complete cleaned dataset that was written
+    """
+    existing = None
+    skip_years = None
+    if append and os.path.exists(output_path):
+        # Kept as text so existing rows are written back unchanged
+        existing = pd.read_csv(output_path, dtype=str, encoding="utf-8-sig")
+        skip_years = set(existing["year"].dropna())
+
+    parts = []
+    text_cols = []
+    for cleaned, _, text_cols in iter_cleaned_chunks(input_path, chunksize, skip_years):
+        parts.append(cleaned)
+
+    new_rows = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    if existing is not None:
+        print(f"New rows for years not yet cleaned: {len(new_rows)}")
+        df = pd.concat([existing, new_rows], ignore_index=True) if len(new_rows) else existing
+    else:
+        df = new_rows
+
+    # Quick sanity check: remaining "bad" characters in text columns
+    report_suspicious(df, text_cols)
+
+    df.to_csv(output_path, index=False, encoding="utf-8-sig")
+    print(f"Saved -> {output_path}")
+
+    # Typed columnar copy (Feather) that the app loads instead of parsing the CSV.
+    # Only for .csv outputs: the copy of "cleaned" would be cleaned.feather, the
+    # app's copy of cleaned.csv
+    if os.path.splitext(output_path)[1].lower() == ".csv":
+        columnar = write_columnar(df, output_path)
+        print(f"Saved -> {columnar}" if columnar else "pyarrow not installed, skipped columnar copy")
+    else:
+        print("Output is not a .csv file, skipped columnar copy")
+    print("Final rows:", len(df))
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the graduate employment survey CSV.")
+    parser.add_argument("--input", default=INPUT)
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--append", action="store_true",
+                        help="only clean years missing from the existing output and append them")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    args = parser.parse_args()
+
+    run_pipeline(args.input, args.output, append=args.append, chunksize=args.chunksize)
@@ -0,0 +1,267 @@
+import argparse
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from app.dataset_store import write_columnar
+
+SOURCE = "cleaned.csv"
+OUTPUT_DIR = "synthetic"
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app")
+
+KEYS = ["university", "school", "degree"]
+COLUMNS = [
+    "year", "university", "school", "degree",
+    "employment_rate_overall", "employment_rate_ft_perm",
+    "basic_monthly_mean", "basic_monthly_median",
+    "gross_monthly_mean", "gross_monthly_median",
+    "gross_mthly_25_percentile", "gross_mthly_75_percentile",
+]
+
+def series_profiles(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarise every (university, school, degree) series of the source data.
+
+    Each profile keeps the series' salary level and yearly growth, its
+    employment rates, the salary ratios that tie the metric columns together
+    and the share of the year range it covers.
+
+    Returns:
+        DataFrame with one row per series
+    """
+    d = df.dropna(subset=COLUMNS).copy()
+    n_years = d["year"].max() - d["year"].min() + 1
+    median = d["gross_monthly_median"]
+    d["log_median"] = np.log(median)
+    d["ft_ratio"] = d["employment_rate_ft_perm"] / d["employment_rate_overall"]
+    d["p25_ratio"] = d["gross_mthly_25_percentile"] / median
+    d["p75_ratio"] = d["gross_mthly_75_percentile"] / median
+    d["mean_ratio"] = d["gross_monthly_mean"] / median
+    d["basic_median_ratio"] = d["basic_monthly_median"] / median
+    d["basic_mean_ratio"] = d["basic_monthly_mean"] / d["gross_monthly_mean"]
+
+    g = d.groupby(KEYS, sort=False, observed=True)
+    profiles = g.agg(
+        year_mean=("year", "mean"),
+        log_median=("log_median", "mean"),
+        employment=("employment_rate_overall", "mean"),
+        ft_ratio=("ft_ratio", "mean"),
+        p25_ratio=("p25_ratio", "mean"),
+        p75_ratio=("p75_ratio", "mean"),
+        mean_ratio=("mean_ratio", "mean"),
+        basic_median_ratio=("basic_median_ratio", "mean"),
+        basic_mean_ratio=("basic_mean_ratio", "mean"),
+        years=("year", "nunique"),
+    ).reset_index()
+
+    # Log-linear salary growth per series (0 for single-year series)
+    x = d["year"] - g["year"].transform("mean")
+    y = d["log_median"] - g["log_median"].transform("mean")
+    sxy = (x * y).groupby([d[k] for k in KEYS], sort=False, observed=True).sum()
+    sxx = (x * x).groupby([d[k] for k in KEYS], sort=False, observed=True).sum()
+    growth = (sxy / sxx.where(sxx > 0)).to_numpy()
+
+    # Short series give wild slopes: use the typical growth for them and clip
+    # the rest, so extended year ranges stay within a plausible salary band
+    reliable = profiles["years"].to_numpy() >= 3
+    typical = np.nanmedian(growth[reliable]) if reliable.any() else 0.0
+    low, high = np.nanpercentile(growth[reliable], [5, 95]) if reliable.any() else (0.0, 0.0)
+    profiles["growth"] = np.clip(np.where(reliable, growth, typical), low, high)
+    profiles["coverage"] = profiles["years"] / n_years
+    return profiles
+
+def _noise_scales(df: pd.DataFrame, profiles: pd.DataFrame) -> dict:
+    """Year-to-year spread around each series' level, measured on the source data."""
+    d = df.dropna(subset=COLUMNS)
+    merged = d.merge(profiles[KEYS + ["log_median", "employment"]], on=KEYS)
+    multi = merged.groupby(KEYS, observed=True)["year"].transform("size") > 1
+    merged = merged[multi]
+    return {
+        "salary": float(np.std(np.log(merged["gross_monthly_median"]) - merged["log_median"])) or 0.05,
+        "employment": float(np.std(merged["employment_rate_overall"] - merged["employment"])) or 3.0,
+    }
+
+def generate(
+    source: pd.DataFrame,
+    universities=None,
+    years=None,
+    degree_factor=1,
+    seed=0,
+) -> pd.DataFrame:
+    """
+    Generate a synthetic dataset with the schema and statistical shape of the source.
+
+    Args:
+        source: Cleaned dataset used as the model
+        universities: Number of institutions (default: as many as the source).
+            Extra institutions copy the school/degree structure of a source one.
+        years: (first, last) year range (default: the source range)
+        degree_factor: Degree variants generated per source degree
+        seed: Random seed; the same arguments always give the same dataset
+
+    Returns:
+        DataFrame with the columns of cleaned.csv, ordered by year
+    """
+    rng = np.random.default_rng(seed)
+    profiles = series_profiles(source)
+    noise = _noise_scales(source, profiles)
+
+    src_unis = list(dict.fromkeys(profiles["university"]))
+    n_unis = universities or len(src_unis)
+    first, last = years or (int(source["year"].min()), int(source["year"].max()))
+    year_values = np.arange(first, last + 1)
+
+    # Series table: one row per (institution, school, degree variant)
+    parts = []
+    for i in range(n_unis):
+        template = src_unis[i % len(src_unis)]
+        copy_no = i // len(src_unis)
+        p = profiles[profiles["university"] == template]
+        for variant in range(degree_factor):
+            s = p.copy()
+            if copy_no:
+                s["university"] = f"{template} {copy_no + 1}"
+            if variant:
+                s["degree"] = s["degree"] + f" (Track {variant + 1})"
+            s["copied"] = bool(copy_no or variant)
+            parts.append(s)
+    series = pd.concat(parts, ignore_index=True)
+    n = len(series)
+
+    # Per-series level: copied profiles are perturbed so no two series are identical
+    jittered = series["copied"].to_numpy()
+    level_noise = np.where(jittered, rng.normal(0, 0.08, n), 0.0)
+    log_level = series["log_median"].to_numpy() + level_noise
+    growth = series["growth"].to_numpy() + np.where(jittered, rng.normal(0, 0.01, n), 0.0)
+    employment = series["employment"].to_numpy() + np.where(jittered, rng.normal(0, 2.0, n), 0.0)
+
+    # Contiguous span of years per series, covering the same share of the range as its template
+    n_years = len(year_values)
+    length = np.clip(np.round(series["coverage"].to_numpy() * n_years), 1, n_years).astype(int)
+    start = (rng.random(n) * (n_years - length + 1)).astype(int)
+
+    idx = np.repeat(np.arange(n), length)
+    offset = np.arange(len(idx)) - np.repeat(np.cumsum(length) - length, length)
+    year = year_values[start[idx] + offset]
+    m = len(idx)
+
+    # Salaries: log-linear trend around each template's mean year plus yearly noise
+    log_median = (log_level[idx] + growth[idx] * (year - series["year_mean"].to_numpy()[idx])
+                  + rng.normal(0, noise["salary"], m))
+    median = np.round(np.exp(log_median))
+
+    def ratio(col, spread):
+        return series[col].to_numpy()[idx] * np.exp(rng.normal(0, spread, m))
+
+    p25 = np.minimum(np.round(median * ratio("p25_ratio", 0.02)), median)
+    p75 = np.maximum(np.round(median * ratio("p75_ratio", 0.02)), median)
+    gross_mean = np.round(median * ratio("mean_ratio", 0.02))
+    basic_median = np.round(median * ratio("basic_median_ratio", 0.01))
+    basic_mean = np.round(gross_mean * ratio("basic_mean_ratio", 0.01))
+
+    overall = np.clip(np.round(employment[idx] + rng.normal(0, noise["employment"], m), 1), 0, 100)
+    ft_perm = np.clip(np.round(overall * np.clip(ratio("ft_ratio", 0.03), 0, 1), 1), 0, overall)
+
+    df = pd.DataFrame({
+        "year": year,
+        "university": series["university"].to_numpy()[idx],
+        "school": series["school"].to_numpy()[idx],
+        "degree": series["degree"].to_numpy()[idx],
+        "employment_rate_overall": overall,
+        "employment_rate_ft_perm": ft_perm,
+        "basic_monthly_mean": basic_mean,
+        "basic_monthly_median": basic_median,
+        "gross_monthly_mean": gross_mean,
+        "gross_monthly_median": median,
+        "gross_mthly_25_percentile": p25,
+        "gross_mthly_75_percentile": p75,
+    }, columns=COLUMNS)
+    return df.sort_values("year", kind="mergesort").reset_index(drop=True)
+
+def degree_factor_for_rows(source: pd.DataFrame, rows: int, universities=None, years=None) -> int:
+    """Smallest degree factor whose generated dataset has at least `rows` rows (approximately)."""
+    sample = generate(source, universities, years, degree_factor=1)
+    return max(1, math.ceil(rows / max(len(sample), 1)))
+
+def write_dataset(df: pd.DataFrame, output_dir: str, columnar=True, derive=False) -> list:
+    """
+    Write a generated dataset in the layout the app reads (see GES_DATA_DIR).
+
+    Args:
+        df: Generated cleaned dataset
+        output_dir: Directory to write into
+        columnar: Also write Feather copies next to each CSV
+        derive: Also build grouped_salary_analysis.csv and function5_data.csv
+
+    Returns:
+        list: Paths of the files written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    cleaned_path = os.path.join(output_dir, "cleaned.csv")
+    raw_path = os.path.join(output_dir, "raw.csv")
+    written = []
+
+    # CSVs are always written: the app and its columnar cache key off them
+    df.to_csv(cleaned_path, index=False, encoding="utf-8-sig")
+    df.to_csv(raw_path, index=False)
+    written += [cleaned_path, raw_path]
+    if columnar:
+        written += [p for p in (write_columnar(df, cleaned_path), write_columnar(df, raw_path)) if p]
+
+    if derive:
+        # App modules use flat imports, so derivations run with app/ on the path
+        sys.path.insert(0, APP_DIR)
+        from dataset_store import get_dataset
+        from salary_analysis import build_grouped_salary_data
+        from function5_projection import get_projection_table
+
+        grouped_path = os.path.join(output_dir, "grouped_salary_analysis.csv")
+        grouped = build_grouped_salary_data(get_dataset(cleaned_path))
+        grouped.to_csv(grouped_path, index=False)
+
+        projections_path = os.path.join(output_dir, "function5_data.csv")
+        projections = get_projection_table(cleaned_path)
+        projections.to_csv(projections_path, index=False)
+        written += [grouped_path, projections_path]
+
+        if columnar:
+            written += [p for p in (write_columnar(grouped, grouped_path),
+                                    write_columnar(projections, projections_path)) if p]
+    return written
+
+def _year_range(value):
+    try:
+        first, last = (int(v) for v in value.split("-"))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected FIRST-LAST, e.g. 2005-2030")
+    if first > last:
+        raise argparse.ArgumentTypeError("first year is after last year")
+    return first, last
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic graduate employment survey dataset.")
+    parser.add_argument("--source", default=SOURCE, help="cleaned dataset used as the model")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--universities", type=int, help="number of institutions (default: as in the source)")
+    parser.add_argument("--years", type=_year_range, help="year range FIRST-LAST (default: as in the source)")
+    parser.add_argument("--degree-factor", type=int, default=1, help="degree variants per source degree")
+    parser.add_argument("--rows", type=int, help="approximate row count; overrides --degree-factor")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-feather", action="store_true", help="skip the columnar (Feather) copies")
+    parser.add_argument("--derive", action="store_true",
+                        help="also write grouped_salary_analysis.csv and function5_data.csv")
+    args = parser.parse_args()
+
+    source = pd.read_csv(args.source, encoding="utf-8-sig")
+    factor = args.degree_factor
+    if args.rows:
+        factor = degree_factor_for_rows(source, args.rows, args.universities, args.years)
+
+    df = generate(source, args.universities, args.years, factor, args.seed)
+    for path in write_dataset(df, args.output_dir, columnar=not args.no_feather, derive=args.derive):
+        print(f"Saved -> {path}")
+    print(f"Rows: {len(df)} | universities: {df['university'].nunique()} | "
+          f"degrees: {df['degree'].nunique()} | years: {df['year'].min()}-{df['year'].max()}")